@@ -0,0 +1,115 @@
+"""
+Micro-benchmark of the transcript formatter used by the ETL.
+
+Compares the previous pandas-based formatter with the streaming formatter in
+`func/etl/transcripts.py` on a synthetic transcript, reporting wall time and peak
+Python memory. pandas is only needed for the baseline and is not a dependency of the function.
+
+    python bench/transcript_render.py --fragments 20000 --repeat 5
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "func", "etl")
+)
+
+from transcripts import write_transcript
+
+
+def make_fragments(count: int) -> list[dict]:
+    fragments = []
+    for i in range(count):
+        fragments.append(
+            {
+                "id": i + 1,
+                "text": f"This is sentence number {i} of a fairly long recorded meeting.",
+                "confidence": 0.9,
+                "speakerId": i % 4 + 1,
+                "language": "en-US",
+                "instances": [
+                    {
+                        "adjustedStart": f"0:{i // 60:02d}:{i % 60:02d}",
+                        "adjustedEnd": f"0:{i // 60:02d}:{i % 60:02d}.9",
+                        "start": f"0:{i // 60:02d}:{i % 60:02d}",
+                        "end": f"0:{i // 60:02d}:{i % 60:02d}.9",
+                    }
+                ],
+            }
+        )
+    return fragments
+
+
+def pandas_render(video_name: str, fragments: list[dict]) -> bytes:
+    import pandas as pd
+
+    transcript_elements = []
+    for fragment in fragments:
+        fragment_dict = {
+            "text": fragment["text"],
+            "start": fragment["instances"][0]["start"],
+            "end": fragment["instances"][0]["end"],
+        }
+        transcript_elements.append(fragment_dict)
+
+    transcript_df = pd.DataFrame(transcript_elements)
+    file_text = f"Video Name: {video_name}\n"
+    transcript_df["line"] = (
+        transcript_df["start"]
+        + " - "
+        + transcript_df["end"]
+        + ": "
+        + transcript_df["text"]
+    )
+    file_text += "\n".join(transcript_df["line"].tolist())
+    return file_text.encode("utf-8")
+
+
+def streaming_render(video_name: str, fragments: list[dict]) -> bytes:
+    buffer = io.BytesIO()
+    write_transcript(video_name, iter(fragments), buffer)
+    return buffer.getvalue()
+
+
+def measure(render, fragments: list[dict], repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render("benchmark", fragments)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    render("benchmark", fragments)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fragments", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    fragments = make_fragments(args.fragments)
+
+    # The pandas import is part of what the streaming formatter saves on every cold start
+    start = time.perf_counter()
+    import pandas  # noqa: F401
+
+    print(f"pandas import: {time.perf_counter() - start:.3f}s")
+
+    assert pandas_render("benchmark", fragments) == streaming_render(
+        "benchmark", fragments
+    ), "Formatters produce different output"
+
+    for name, render in [("pandas", pandas_render), ("streaming", streaming_render)]:
+        seconds, peak = measure(render, fragments, args.repeat)
+        print(
+            f"{name:>9}: {seconds * 1000:8.1f} ms, peak {peak / 1024 / 1024:6.1f} MiB "
+            + f"({args.fragments} fragments, best of {args.repeat})"
+        )
@@ -0,0 +1,214 @@
+"""
+Recall-vs-latency benchmark of vector storage and HNSW configurations of the search index.
+
+Creates one scratch index per configuration with `srch/setup.py`'s `create_index`, uploads the
+same vectors to each (sampled from the existing index, which must store its vectors, or
+synthetic), then runs the same vector queries against every index. Recall@k is measured
+against an exhaustive (exact) search of the full-precision baseline, latency is client-side
+wall time per query, and size is the index's storage and vector index size.
+
+    python bench/vector_search.py --srch-url <SearchURL> --srch-api-key <SearchAPIKey> \\
+        --openai-url <OpenAIURL> --documents 5000 --queries 100
+
+Configurations are given as `name:key=value,...` with keys vector_type, compression,
+oversampling, store_vectors, m, ef_construction and ef_search, e.g.
+`--config half-scalar:vector_type=half,compression=scalar`.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+from azure.core.credentials import AzureKeyCredential
+from azure.search.documents import SearchClient
+from azure.search.documents.indexes import SearchIndexClient
+from azure.search.documents.models import VectorizedQuery
+
+root = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, os.path.join(root, "func", "etl"))
+sys.path.insert(0, os.path.join(root, "srch"))
+
+from indexing import upload_documents
+from setup import INDEX_NAME, create_index
+
+DIMENSIONS = 1024
+BENCH_INDEX_PREFIX = "rag-transcript-bench"
+
+# The first configuration is the full-precision baseline that ground truth is computed on
+DEFAULT_CONFIGS = [
+    "baseline:",
+    "half:vector_type=half",
+    "scalar:compression=scalar",
+    "half-scalar:vector_type=half,compression=scalar",
+    "binary:compression=binary",
+    "scalar-unstored:compression=scalar,store_vectors=false",
+    "scalar-m8:compression=scalar,m=8,ef_construction=600",
+    "scalar-ef200:compression=scalar,ef_search=200",
+]
+
+CONFIG_TYPES = {
+    "vector_type": str,
+    "compression": str,
+    "oversampling": float,
+    "store_vectors": lambda value: value.lower() == "true",
+    "m": int,
+    "ef_construction": int,
+    "ef_search": int,
+}
+
+
+def parse_config(spec: str) -> tuple[str, dict]:
+    name, _, options = spec.partition(":")
+    config = {}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        config[key] = CONFIG_TYPES[key](value)
+    return name, config
+
+
+def normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def synthetic_vectors(count: int, clusters: int = 50) -> list[list[float]]:
+    # Clustered rather than uniform, so nearest neighbors are meaningful as in real embeddings
+    rng = random.Random(0)
+    centers = [[rng.gauss(0, 1) for _ in range(DIMENSIONS)] for _ in range(clusters)]
+    return [
+        normalize([c + rng.gauss(0, 0.5) for c in rng.choice(centers)])
+        for _ in range(count)
+    ]
+
+
+def source_vectors(search_client: SearchClient, count: int) -> list[list[float]]:
+    results = search_client.search(search_text="*", select=["text_vector"], top=count)
+    vectors = [result["text_vector"] for result in results if result.get("text_vector")]
+    if not vectors:
+        raise RuntimeError(
+            "No vectors retrieved from the source index; it must store its vectors, "
+            + "or use --synthetic"
+        )
+    return vectors
+
+
+def create_bench_index(
+    index_client: SearchIndexClient, openai_url: str, name: str, config: dict
+) -> str:
+    index_name = f"{BENCH_INDEX_PREFIX}-{name}"
+    options = {
+        (f"hnsw_{key}" if key in ("m", "ef_construction", "ef_search") else key): value
+        for key, value in config.items()
+    }
+    index_client.delete_index(index_name)
+    create_index(index_client, openai_url, "chunks", index_name=index_name, **options)
+    return index_name
+
+
+def wait_for_documents(search_client: SearchClient, count: int, timeout_sec: int = 300):
+    deadline = time.monotonic() + timeout_sec
+    while search_client.get_document_count() < count:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Index did not reach {count} documents in {timeout_sec}s")
+        time.sleep(2)
+
+
+def search(
+    search_client: SearchClient, vector: list[float], k: int, exhaustive: bool = False
+) -> tuple[list[str], float]:
+    query = VectorizedQuery(
+        vector=vector, k_nearest_neighbors=k, fields="text_vector", exhaustive=exhaustive
+    )
+    start = time.perf_counter()
+    results = search_client.search(
+        search_text=None, vector_queries=[query], select=["chunk_id"], top=k
+    )
+    keys = [result["chunk_id"] for result in results]
+    return keys, time.perf_counter() - start
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--srch-url", type=str, required=True)
+    parser.add_argument("--srch-api-key", type=str, required=True)
+    parser.add_argument("--openai-url", type=str, required=True)
+    parser.add_argument("--source-index", type=str, default=INDEX_NAME)
+    parser.add_argument(
+        "--synthetic", action="store_true", help="Benchmark on synthetic vectors"
+    )
+    parser.add_argument("--documents", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--config", action="append", dest="configs")
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the benchmark indexes afterwards"
+    )
+    args = parser.parse_args()
+
+    credential = AzureKeyCredential(args.srch_api_key)
+    index_client = SearchIndexClient(args.srch_url, credential)
+    configs = [parse_config(spec) for spec in args.configs or DEFAULT_CONFIGS]
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.documents)
+    else:
+        vectors = source_vectors(
+            SearchClient(args.srch_url, args.source_index, credential), args.documents
+        )
+    documents = [
+        {"chunk_id": f"doc-{i}", "text_vector": vector} for i, vector in enumerate(vectors)
+    ]
+
+    # Queries are perturbed documents, so they are close to, but not exactly, indexed vectors
+    rng = random.Random(1)
+    queries = [
+        normalize([x + rng.gauss(0, 0.01) for x in rng.choice(vectors)])
+        for _ in range(args.queries)
+    ]
+    print(f"{len(documents)} documents, {len(queries)} queries, recall@{args.k}")
+
+    truth = None
+    index_names = []
+    try:
+        for name, config in configs:
+            index_name = create_bench_index(index_client, args.openai_url, name, config)
+            index_names.append(index_name)
+            search_client = SearchClient(args.srch_url, index_name, credential)
+            upload_documents(search_client, documents)
+            wait_for_documents(search_client, len(documents))
+
+            if truth is None:
+                truth = [
+                    set(search(search_client, query, args.k, exhaustive=True)[0])
+                    for query in queries
+                ]
+
+            # Warm up the index before measuring
+            for query in queries[:5]:
+                search(search_client, query, args.k)
+
+            recalls, latencies = [], []
+            for query, expected in zip(queries, truth):
+                keys, seconds = search(search_client, query, args.k)
+                recalls.append(len(expected.intersection(keys)) / args.k)
+                latencies.append(seconds)
+
+            statistics = index_client.get_index_statistics(index_name)
+            print(
+                f"{name:>16}: recall {sum(recalls) / len(recalls):.3f}, "
+                + f"p50 {percentile(latencies, 0.5) * 1000:6.1f} ms, "
+                + f"p95 {percentile(latencies, 0.95) * 1000:6.1f} ms, "
+                + f"storage {statistics['storage_size'] / 1024 / 1024:7.1f} MiB, "
+                + f"vector index {statistics['vector_index_size'] / 1024 / 1024:7.1f} MiB"
+            )
+    finally:
+        if not args.keep:
+            for index_name in index_names:
+                index_client.delete_index(index_name)
@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Iterator, Optional
+import asyncio
+import inspect
+
+from avi_helpers import DEFAULT_POOL_MAXSIZE, VideoIndexerClient
+
+
+class AsyncVideoIndexerClient:
+    """
+    Awaitable facade over `VideoIndexerClient`.
+
+    Every public method of the wrapped client is exposed under the same name as a coroutine,
+    e.g. `await client.get_video_async(video_id)`, and every generator method as an async iterator,
+    e.g. `async for fragment in client.iter_transcript_fragments(video_id)`. Calls, and each step of
+    an iteration, run on a bounded thread pool and share the wrapped client's keep-alive session,
+    so many requests can be in flight at once while reusing a handful of pooled connections.
+    """
+
+    def __init__(
+        self,
+        client: Optional[VideoIndexerClient] = None,
+        max_concurrency: int = DEFAULT_POOL_MAXSIZE,
+    ) -> None:
+        """
+        :param client: Client to wrap. If not provided, one is created with a pool sized to `max_concurrency`
+        :param max_concurrency: Maximum number of calls in flight at once
+        """
+        self.client = (
+            client
+            if client is not None
+            else VideoIndexerClient(pool_maxsize=max_concurrency)
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="avi"
+        )
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        # Iterating a generator blocks too, so it must not run on the event loop
+        if inspect.isgeneratorfunction(attr):
+
+            def call(*args, **kwargs):
+                return self._iterate(attr(*args, **kwargs))
+
+        else:
+
+            async def call(*args, **kwargs):
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    self._executor, partial(attr, *args, **kwargs)
+                )
+
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+        return call
+
+    async def _iterate(self, iterator: Iterator) -> AsyncIterator:
+        loop = asyncio.get_running_loop()
+        done = object()
+        while True:
+            item = await loop.run_in_executor(self._executor, next, iterator, done)
+            if item is done:
+                break
+            yield item
+
+    async def iter_videos(self, **kwargs) -> AsyncIterator[dict]:
+        """
+        Lists the videos in the account as an async iterator, loading one page at a time.
+        Accepts the same arguments as `VideoIndexerClient.iter_video_pages`.
+        """
+        async for page in self._iterate(self.client.iter_video_pages(**kwargs)):
+            for video in page:
+                yield video
+
+    async def iter_prompt_contents(
+        self, video_ids: list[str], **kwargs
+    ) -> AsyncIterator[tuple[str, Optional[dict]]]:
+        """
+        Gets the prompt content of many videos as an async iterator, yielding each as it is ready.
+        Accepts the same arguments as `VideoIndexerClient.iter_prompt_contents`.
+        """
+        async for result in self._iterate(
+            self.client.iter_prompt_contents(video_ids, **kwargs)
+        ):
+            yield result
+
+    def close(self) -> None:
+        """
+        Shut down the worker threads and close the pooled session
+        """
+        self._executor.shutdown(wait=True)
+        self.client.session.close()
+
+    async def __aenter__(self) -> "AsyncVideoIndexerClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
@@ -1,14 +1,59 @@
 # Modified from https://github.com/Azure-Samples/azure-video-indexer-samples
 from dataclasses import dataclass
-from typing import Optional
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator, Optional, Union
 from urllib.parse import urlparse
+import base64
+import json
 import logging
 import os
+import random
+import threading
 import time
 
+from azure.core.credentials import AccessToken, TokenCredential
 from azure.identity import DefaultAzureCredential
+from azure.storage.blob import BlobServiceClient
+from requests.adapters import HTTPAdapter
+import ijson
 import requests
 
+from content_cache import video_cache_key
+from request_policy import RequestPolicy
+from staging import (
+    DEFAULT_BLOCK_SIZE,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_STAGING_CONTAINER_NAME,
+    generate_read_sas_url,
+    stage_file,
+)
+
+
+DEFAULT_POOL_MAXSIZE = 32
+DEFAULT_LIST_PAGE_SIZE = 100
+
+# Tokens are refreshed in the background this long before they expire, and synchronously once
+# less than the minimum remains. Video Indexer tokens are valid for one hour.
+TOKEN_REFRESH_MARGIN_SEC = 300
+TOKEN_MIN_REMAINING_SEC = 60
+VI_TOKEN_LIFETIME_SEC = 3600
+
+# Indexing status is polled from the lightweight list entry of a video, at intervals adapted to
+# its progress: about half the estimated remaining time, within these bounds
+POLL_MIN_INTERVAL_SEC = 5
+POLL_MAX_INTERVAL_SEC = 120
+
+# Prompt content is checked for at exponentially growing intervals between these bounds
+PROMPT_CONTENT_POLL_INITIAL_SEC = 5
+PROMPT_CONTENT_POLL_MAX_SEC = 60
+PROMPT_CONTENT_KIND = "prompt-content"
+TRANSCRIPT_CACHE_KIND = "transcript"
+DEFAULT_PROMPT_CONTENT_WORKERS = 8
+
+# Insights selection for callers that only read the transcript (faces, OCR, labels, etc. are not downloaded)
+TRANSCRIPT_ONLY_INSIGHTS = ["Transcript"]
+
 
 @dataclass
 class Consts:
@@ -33,18 +78,38 @@ class Consts:
             )
 
 
-def get_arm_access_token(consts: Consts) -> str:
+def create_session(pool_maxsize: int = DEFAULT_POOL_MAXSIZE) -> requests.Session:
+    """
+    Create a keep-alive HTTP session shared by all Video Indexer and ARM calls
+
+    :param pool_maxsize: Maximum number of pooled connections kept open per host
+    :return: Session with a connection pool sized for concurrent callers
+    """
+    session = requests.Session()
+    # Only a handful of hosts are involved (ARM and the Video Indexer API), so few
+    # pools are needed, but each one must hold as many connections as concurrent callers.
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_arm_access_token(
+    consts: Consts, credential: Optional[TokenCredential] = None
+) -> AccessToken:
     """
     Get an access token for the Azure Resource Manager
     Make sure you're logged in with `az` first
 
     :param consts: Consts object
-    :return: Access token for the Azure Resource Manager
+    :param credential: Credential to get the token with. If not provided, a new `DefaultAzureCredential` is used
+    :return: Access token for the Azure Resource Manager, with its expiry
     """
-    credential = DefaultAzureCredential()
+    if credential is None:
+        credential = DefaultAzureCredential()
     scope = f"{consts.AzureResourceManager}/.default"
     token = credential.get_token(scope)
-    return token.token
+    return token
 
 
 def get_account_access_token_async(
@@ -53,6 +118,8 @@ def get_account_access_token_async(
     permission_type="Contributor",
     scope="Account",
     video_id=None,
+    session: Optional[requests.Session] = None,
+    request_policy: Optional[RequestPolicy] = None,
 ):
     """
     Get an access token for the Video Indexer account
@@ -62,6 +129,8 @@ def get_account_access_token_async(
     :param permission_type: Permission type for the access token
     :param scope: Scope for the access token
     :param video_id: Video ID for the access token, if scope is Video. Otherwise, not required
+    :param session: Session to send the request with. If not provided, a one-off connection is used
+    :param request_policy: Policy to rate limit and retry the request with. If not provided, it is sent once
     :return: Access token for the Video Indexer account
     """
 
@@ -80,7 +149,14 @@ def get_account_access_token_async(
     if video_id is not None:
         params["videoId"] = video_id
 
-    response = requests.post(url, json=params, headers=headers)
+    send = (session or requests).request
+    if request_policy is not None:
+        # Requesting another token is harmless, so the POST is retried like a GET
+        response = request_policy.send(
+            send, "POST", url, idempotent=True, json=params, headers=headers
+        )
+    else:
+        response = send("POST", url, json=params, headers=headers)
 
     # check if the response is valid
     response.raise_for_status()
@@ -90,24 +166,245 @@ def get_account_access_token_async(
     return access_token
 
 
+def _get_jwt_expiry(token: str) -> Optional[float]:
+    """
+    Read the expiry (`exp` claim) of a JWT without validating it
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenCache:
+    """
+    Thread-safe cache of the ARM and Video Indexer access tokens.
+
+    Tokens are keyed by (scope, permission type, video ID) and kept with their expiry.
+    A token that is about to expire is refreshed in the background while the cached one is still
+    served, and only one refresh per key runs at a time, so concurrent callers never stampede the
+    ARM `generateAccessToken` endpoint. A single credential object is reused for all ARM tokens.
+    """
+
+    ARM_KEY = ("ARM", None, None)
+
+    def __init__(
+        self,
+        consts: Consts,
+        session: Optional[requests.Session] = None,
+        credential: Optional[TokenCredential] = None,
+        refresh_margin_sec: int = TOKEN_REFRESH_MARGIN_SEC,
+        request_policy: Optional[RequestPolicy] = None,
+    ) -> None:
+        """
+        :param consts: Consts object
+        :param session: Session to request Video Indexer tokens with
+        :param request_policy: Policy to rate limit and retry the token requests with
+        :param credential: Credential for ARM tokens. If not provided, a `DefaultAzureCredential` is created
+        :param refresh_margin_sec: How long before expiry a token is refreshed in the background
+        """
+        self.consts = consts
+        self.session = session
+        self.credential = credential if credential is not None else DefaultAzureCredential()
+        self.refresh_margin_sec = refresh_margin_sec
+        self.request_policy = request_policy
+        self._tokens: dict[tuple, tuple[str, float]] = {}
+        self._key_locks: dict[tuple, threading.Lock] = {}
+        self._refreshing: set[tuple] = set()
+        self._lock = threading.Lock()
+
+    def get_arm_token(self) -> str:
+        """
+        :return: A valid access token for the Azure Resource Manager
+        """
+        return self._get(self.ARM_KEY)
+
+    def get_vi_token(
+        self,
+        permission_type: str = "Contributor",
+        scope: str = "Account",
+        video_id: Optional[str] = None,
+    ) -> str:
+        """
+        :param permission_type: Permission type for the access token
+        :param scope: Scope for the access token
+        :param video_id: Video ID for the access token, if scope is Video. Otherwise, not required
+        :return: A valid access token for the Video Indexer account
+        """
+        return self._get((scope, permission_type, video_id))
+
+    def _get(self, key: tuple) -> str:
+        now = time.time()
+        with self._lock:
+            cached = self._tokens.get(key)
+
+        if cached is not None:
+            token, expires_on = cached
+            if now < expires_on - self.refresh_margin_sec:
+                return token
+            if now < expires_on - TOKEN_MIN_REMAINING_SEC:
+                self._refresh_in_background(key)
+                return token
+
+        # Missing or (nearly) expired: refresh synchronously, once per key
+        with self._key_lock(key):
+            with self._lock:
+                cached = self._tokens.get(key)
+            if cached is not None and time.time() < cached[1] - TOKEN_MIN_REMAINING_SEC:
+                return cached[0]
+            return self._refresh(key)
+
+    def _key_lock(self, key: tuple) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _refresh_in_background(self, key: tuple) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh() -> None:
+            try:
+                with self._key_lock(key):
+                    self._refresh(key)
+            except Exception:
+                logging.exception(f"Background refresh of the {key} access token failed.")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _refresh(self, key: tuple) -> str:
+        if key == self.ARM_KEY:
+            arm_token = get_arm_access_token(self.consts, self.credential)
+            token, expires_on = arm_token.token, float(arm_token.expires_on)
+        else:
+            scope, permission_type, video_id = key
+            token = get_account_access_token_async(
+                self.consts,
+                self.get_arm_token(),
+                permission_type=permission_type,
+                scope=scope,
+                video_id=video_id,
+                session=self.session,
+                request_policy=self.request_policy,
+            )
+            expires_on = _get_jwt_expiry(token) or time.time() + VI_TOKEN_LIFETIME_SEC
+
+        now = time.time()
+        with self._lock:
+            # Drop expired video-scoped tokens so the cache does not grow with every video seen
+            for stale_key in [k for k, (_, exp) in self._tokens.items() if exp <= now]:
+                del self._tokens[stale_key]
+            self._tokens[key] = (token, expires_on)
+        logging.debug(f"Refreshed the {key[0]} access token.")
+        return token
+
+
+def _insights_params(
+    included_insights: Optional[list[str]], excluded_insights: Optional[list[str]]
+) -> dict:
+    params = {}
+    if included_insights:
+        params["includedInsights"] = ",".join(included_insights)
+    if excluded_insights:
+        params["excludedInsights"] = ",".join(excluded_insights)
+    return params
+
+
+def _format_date(value: Union[datetime, str]) -> str:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def get_processing_progress(video: dict) -> Optional[int]:
+    """
+    :param video: Video entry as returned by `list_videos_async`
+    :return: Indexing progress in percent (`processingProgress`, e.g. "45%"), if known
+    """
+    progress = str(video.get("processingProgress") or "").rstrip("%")
+    return int(progress) if progress.isdigit() else None
+
+
+def next_poll_interval(
+    progress: Optional[int], elapsed_sec: float, previous_interval_sec: Optional[float]
+) -> float:
+    """
+    Chooses when to check an indexing video again: at about half its estimated remaining time
+    while it reports progress, otherwise backing off exponentially.
+
+    :param progress: Indexing progress in percent, if known
+    :param elapsed_sec: Time since the video was submitted
+    :param previous_interval_sec: Previous polling interval, if any
+    :return: Seconds to wait before the next check
+    """
+    if progress and 0 < progress < 100:
+        interval = elapsed_sec * (100 - progress) / progress / 2
+    elif previous_interval_sec:
+        interval = previous_interval_sec * 2
+    else:
+        interval = POLL_MIN_INTERVAL_SEC
+    return min(max(interval, POLL_MIN_INTERVAL_SEC), POLL_MAX_INTERVAL_SEC)
+
+
 def get_file_name_no_extension(file_path):
     return os.path.splitext(os.path.basename(file_path))[0]
 
 
 class VideoIndexerClient:
-    def __init__(self) -> None:
-        self.arm_access_token = ""
-        self.vi_access_token = ""
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        request_policy: Optional[RequestPolicy] = None,
+    ) -> None:
+        """
+        :param session: Session to share with other clients. If not provided, a pooled session is created
+        :param pool_maxsize: Maximum number of pooled connections per host, if the session is created here
+        :param request_policy: Rate limiting, retry and circuit breaker policy for Video Indexer API calls.
+            If not provided, the account's default quota is used. ARM calls have a policy of their own
+        """
+        self.tokens: Optional[TokenCache] = None
         self.account = None
         self.consts = None
+        self.session = session if session is not None else create_session(pool_maxsize)
+        self.request_policy = (
+            request_policy if request_policy is not None else RequestPolicy()
+        )
+        self.arm_request_policy = RequestPolicy()
+        self._account_lock = threading.Lock()
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        policy: Optional[RequestPolicy] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Send a request over the client's pooled session, rate limited and retried by the request policy
+        """
+        policy = policy if policy is not None else self.request_policy
+        return policy.send(self.session.request, method, url, **kwargs)
 
     def authenticate_async(self, consts: Consts) -> None:
         self.consts = consts
-        # Get access tokens
-        self.arm_access_token = get_arm_access_token(self.consts)
-        self.vi_access_token = get_account_access_token_async(
-            self.consts, self.arm_access_token
+        # Get access tokens; they are cached and refreshed before they expire
+        self.tokens = TokenCache(
+            self.consts, session=self.session, request_policy=self.arm_request_policy
         )
+        self.tokens.get_vi_token()
+
+    @property
+    def arm_access_token(self) -> str:
+        return self.tokens.get_arm_token() if self.tokens is not None else ""
+
+    @property
+    def vi_access_token(self) -> str:
+        return self.tokens.get_vi_token() if self.tokens is not None else ""
 
     def get_account_async(self) -> None:
         """
@@ -116,6 +413,15 @@ class VideoIndexerClient:
         if self.account is not None:
             return self.account
 
+        with self._account_lock:
+            if self.account is None:
+                self._fetch_account()
+        return self.account
+
+    def _fetch_account(self) -> None:
+        """
+        Fetch the account details from the Azure Resource Manager
+        """
         headers = {
             "Authorization": "Bearer " + self.arm_access_token,
             "Content-Type": "application/json",
@@ -127,7 +433,9 @@ class VideoIndexerClient:
             + f"?api-version={self.consts.ApiVersion}"
         )
 
-        response = requests.get(url, headers=headers)
+        response = self._request(
+            "GET", url, policy=self.arm_request_policy, headers=headers
+        )
 
         response.raise_for_status()
 
@@ -144,6 +452,7 @@ class VideoIndexerClient:
         wait_for_index: bool = False,
         video_description: str = "",
         privacy="private",
+        callback_url: Optional[str] = None,
     ) -> str:
         """
         Uploads a video and starts the video index.
@@ -155,6 +464,8 @@ class VideoIndexerClient:
         :param wait_for_index: Should this method wait for index operation to complete
         :param video_description: The description of the video
         :param privacy: The privacy mode of the video
+        :param callback_url: URL notified with the video ID and state when indexing finishes,
+            e.g. the ETL's `video_indexer_callback` function
         :return: Video Id of the video being indexed, otherwise throws exception
         """
         if excluded_ai is None:
@@ -180,7 +491,10 @@ class VideoIndexerClient:
         if len(excluded_ai) > 0:
             params["excludedAI"] = ",".join(excluded_ai)
 
-        response = requests.post(url, params=params)
+        if callback_url is not None:
+            params["callbackUrl"] = callback_url
+
+        response = self._request("POST", url, params=params)
 
         response.raise_for_status()
 
@@ -200,6 +514,7 @@ class VideoIndexerClient:
         video_description: str = "",
         privacy="private",
         partition="",
+        callback_url: Optional[str] = None,
     ) -> str:
         """
         Uploads a local file and starts the video index.
@@ -210,6 +525,8 @@ class VideoIndexerClient:
         :param excluded_ai: The ExcludeAI list to run
         :param video_description: The description of the video
         :param privacy: The privacy mode of the video
+        :param callback_url: URL notified with the video ID and state when indexing finishes,
+            e.g. the ETL's `video_indexer_callback` function
         :param partition: The partition of the video
         :return: Video Id of the video being indexed, otherwise throws excpetion
         """
@@ -239,100 +556,128 @@ class VideoIndexerClient:
         if len(excluded_ai) > 0:
             params["excludedAI"] = ",".join(excluded_ai)
 
+        if callback_url is not None:
+            params["callbackUrl"] = callback_url
+
         print("Uploading a local file using multipart/form-data post request..")
 
-        response = requests.post(
-            url, params=params, files={"file": open(media_path, "rb")}
-        )
+        with open(media_path, "rb") as media_file:
+            response = self._request(
+                "POST", url, params=params, files={"file": media_file}
+            )
 
         response.raise_for_status()
 
-        if response.status_code != 200:
-            print(f"Request failed with status code: {response.StatusCode}")
-
         video_id = response.json().get("id")
 
         return video_id
 
+    def staged_file_upload_async(
+        self,
+        media_path: str,
+        blob_service_client: BlobServiceClient,
+        video_name: Optional[str] = None,
+        container_name: str = DEFAULT_STAGING_CONTAINER_NAME,
+        blob_name: Optional[str] = None,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        **upload_options,
+    ) -> str:
+        """
+        Uploads a large local file and starts the video index. The file is staged to blob storage
+        in parallel, resumable blocks, and Video Indexer downloads it from a read-only SAS link
+        (see `upload_url_async`), instead of receiving it in a single multipart request.
+
+        :param media_path: The path to the local file
+        :param blob_service_client: Blob service client authenticated with Microsoft Entra ID
+        :param video_name: The name of the video, if not provided, the file name will be used
+        :param container_name: The container to stage the file in
+        :param blob_name: The name of the staged blob, if not provided, the file name will be used
+        :param block_size: Size of each uploaded block, in bytes
+        :param max_concurrency: Number of blocks uploaded in parallel
+        :param upload_options: Other arguments of `upload_url_async`, e.g. `excluded_ai` or `callback_url`
+        :return: Video Id of the video being indexed, otherwise throws exception
+        """
+        if not os.path.exists(media_path):
+            raise Exception(f"Could not find the local file {media_path}")
+
+        if video_name is None:
+            video_name = get_file_name_no_extension(media_path)
+
+        blob_client = blob_service_client.get_blob_client(
+            container_name, blob_name or os.path.basename(media_path)
+        )
+        stage_file(blob_client, media_path, block_size, max_concurrency)
+
+        return self.upload_url_async(
+            video_name[:80],
+            generate_read_sas_url(blob_service_client, blob_client),
+            **upload_options,
+        )
+
     def wait_for_index_async(
         self,
         video_id: str,
-        language: str = "English",
         timeout_sec: Optional[int] = None,
-    ) -> None:
+    ) -> Optional[str]:
         """
-        Calls getVideoIndex API in 10 second intervals until the indexing state is 'processed'
-        (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=Get-Video-Index).
-        Prints video index when the index is complete, otherwise throws exception.
+        Waits until the indexing state is 'Processed' or 'Failed', checking the video's list entry
+        (see `get_video_entry`) rather than downloading its index, at intervals adapted to the
+        reported progress (see `next_poll_interval`). To wait for many videos, see `submitter.BatchSubmitter`.
 
         :param video_id: The video ID to wait for
-        :param language: The language to translate video insights
         :param timeout_sec: The timeout in seconds
+        :return: The final state of the video, or None if the timeout was reached
         """
-        self.get_account_async()  # if account is not initialized, get it
-
-        url = (
-            f'{self.consts.ApiEndpoint}/{self.account["location"]}/Accounts/{self.account["properties"]["accountId"]}/'
-            + f"Videos/{video_id}/Index"
-        )
-
-        params = {"accessToken": self.vi_access_token, "language": language}
-
         print(f"Checking if video {video_id} has finished indexing...")
-        processing = True
         start_time = time.time()
-        while processing:
-            response = requests.get(url, params=params)
-
-            response.raise_for_status()
-
-            video_result = response.json()
-            video_state = video_result.get("state")
+        interval = None
+        while True:
+            video = self.get_video_entry(video_id)
+            video_state = video.get("state") if video is not None else None
 
             if video_state == "Processed":
-                processing = False
-                print(
-                    f"The video index has completed. Here is the full JSON of the index for video ID {video_id}: \n{video_result}"
-                )
-                break
+                print(f"The video index has completed for video ID {video_id}.")
+                return video_state
             elif video_state == "Failed":
-                processing = False
                 print(f"The video index failed for video ID {video_id}.")
-                break
+                return video_state
 
-            print(f"The video index state is {video_state}")
+            progress = get_processing_progress(video) if video is not None else None
+            print(f"The video index state is {video_state} ({progress or 0}%)")
 
-            if timeout_sec is not None and time.time() - start_time > timeout_sec:
+            elapsed = time.time() - start_time
+            if timeout_sec is not None and elapsed > timeout_sec:
                 print(f"Timeout of {timeout_sec} seconds reached. Exiting...")
-                break
+                return None
 
-            time.sleep(10)  # wait 10 seconds before checking again
+            interval = next_poll_interval(progress, elapsed, interval)
+            time.sleep(interval)
 
     def is_video_processed(self, video_id: str) -> bool:
-        self.get_account_async()  # if account is not initialized, get it
-
-        url = (
-            f'{self.consts.ApiEndpoint}/{self.account["location"]}/Accounts/{self.account["properties"]["accountId"]}/'
-            + f"Videos/{video_id}/Index"
-        )
-        params = {
-            "accessToken": self.vi_access_token,
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-
-        video_result = response.json()
-        video_state = video_result.get("state")
+        """
+        Checks the video's list entry (see `get_video_entry`) rather than downloading its index
 
-        return video_state == "Processed"
+        :param video_id: The video ID
+        :return: True if the video has finished indexing
+        """
+        video = self.get_video_entry(video_id)
+        return video is not None and video.get("state") == "Processed"
 
-    def get_video_async(self, video_id: str) -> dict:
+    def get_video_async(
+        self,
+        video_id: str,
+        included_insights: Optional[list[str]] = None,
+        excluded_insights: Optional[list[str]] = None,
+    ) -> dict:
         """
         Gets the video index. Calls the index API
         (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=Search-Videos)
         Prints the video metadata, otherwise throws an exception
 
         :param video_id: The video ID
+        :param included_insights: Only include these insights in the index (e.g. `TRANSCRIPT_ONLY_INSIGHTS`)
+        :param excluded_insights: Exclude these insights from the index
         """
         self.get_account_async()  # if account is not initialized, get it
 
@@ -347,8 +692,9 @@ class VideoIndexerClient:
         )
 
         params = {"accessToken": self.vi_access_token}
+        params.update(_insights_params(included_insights, excluded_insights))
 
-        response = requests.get(url, params=params)
+        response = self._request("GET", url, params=params)
 
         response.raise_for_status()
 
@@ -356,29 +702,180 @@ class VideoIndexerClient:
 
         return search_result
 
-    def list_videos_async(self) -> dict:
+    def iter_transcript_fragments(
+        self,
+        video_id: str,
+        language: Optional[str] = None,
+        cache=None,
+        version: Optional[str] = None,
+    ) -> Iterator[dict]:
         """
-        TODO
+        Streams the transcript fragments of the video index one at a time.
+        The index is requested with `TRANSCRIPT_ONLY_INSIGHTS` and parsed incrementally from the
+        response body, so memory stays bounded regardless of the video length.
+        The caller is expected to know the video is processed (e.g. from the list API state).
+
+        With a cache, a transcript cached for the same `version` is returned without any request.
+        Otherwise the index is requested conditionally on the cached response's `ETag` and
+        `Last-Modified`, and a `304 Not Modified` response is answered from the cache. Note that
+        with a cache, memory is no longer bounded: a downloaded transcript is collected in memory
+        as it is streamed, to be stored once complete, and a cached one is loaded whole.
+
+        :param video_id: The video ID
+        :param language: The language to translate the transcript to, if not the source language
+        :param cache: Transcript cache with `get(key)` and `put(key, content)`, e.g.
+            `content_cache.LocalContentCache`. Entries are keyed by video ID and language
+        :param version: Version of the video's index, e.g. `lastModified` from its list entry
+        :return: Iterator over transcript fragments, as they appear under `videos[].insights.transcript`
         """
-        self.get_account_async()  # if account is not initialized, get it
+        key = None
+        entry = None
+        if cache is not None:
+            key = video_cache_key(TRANSCRIPT_CACHE_KIND, video_id, language)
+            entry = cache.get(key)
+            if entry is not None and version is not None and entry["version"] == version:
+                yield from entry["fragments"]
+                return
 
-        # print(f'Searching videos in account {self.account["properties"]["accountId"]} for video ID {video_id}.')
-        # https://api.videoindexer.ai/{location}/Accounts/{accountId}/Videos/{videoId}/Index[?language][&reTranslate][&includeStreamingUrls][&includedInsights][&excludedInsights][&includeSummarizedInsights][&accessToken]
+        self.get_account_async()  # if account is not initialized, get it
 
         url = (
             f'{self.consts.ApiEndpoint}/{self.account["location"]}/Accounts/{self.account["properties"]["accountId"]}/'
-            + f"Videos"
+            + f"Videos/{video_id}/Index"
         )
 
         params = {"accessToken": self.vi_access_token}
+        params.update(_insights_params(TRANSCRIPT_ONLY_INSIGHTS, None))
+        if language is not None:
+            params["language"] = language
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with self._request(
+            "GET", url, params=params, headers=headers, stream=True
+        ) as response:
+            if response.status_code == 304 and entry is not None:
+                if version is not None:
+                    entry["version"] = version
+                    cache.put(key, entry)
+                yield from entry["fragments"]
+                return
 
-        response = requests.get(url, params=params)
+            response.raise_for_status()
+            response.raw.decode_content = True  # transparently decompress gzip responses
+            fragments = ijson.items(
+                response.raw, "videos.item.insights.transcript.item", use_float=True
+            )
+            if cache is None:
+                yield from fragments
+                return
+
+            # Cached once the whole transcript has been read
+            collected = []
+            for fragment in fragments:
+                collected.append(fragment)
+                yield fragment
+
+        cache.put(
+            key,
+            {
+                "version": version,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fragments": collected,
+            },
+        )
 
-        response.raise_for_status()
+    def iter_video_pages(
+        self,
+        page_size: int = DEFAULT_LIST_PAGE_SIZE,
+        states: Optional[list[str]] = None,
+        created_after: Optional[Union[datetime, str]] = None,
+        created_before: Optional[Union[datetime, str]] = None,
+        ids: Optional[list[str]] = None,
+    ) -> Iterator[list[dict]]:
+        """
+        Lists the videos in the account one page at a time, following the `nextPage` continuation.
+        Calls the listVideos API (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=List-Videos),
+        or the searchVideos API when filtering by state or ID, which the list API does not support.
+        Pages are requested lazily, so callers can start processing before later pages are loaded.
+
+        :param page_size: The number of videos requested per page
+        :param states: Only list videos in one of these states (e.g. ["Processed"])
+        :param created_after: Only list videos created after this date
+        :param created_before: Only list videos created before this date
+        :param ids: Only list the videos with these IDs
+        :return: Iterator over pages of video entries
+        """
+        self.get_account_async()  # if account is not initialized, get it
 
-        search_result = response.json()
+        url = (
+            f'{self.consts.ApiEndpoint}/{self.account["location"]}/Accounts/{self.account["properties"]["accountId"]}/'
+            + ("Videos/Search" if states or ids else "Videos")
+        )
+
+        params = {"pageSize": page_size}
+        if states:
+            params["state"] = list(states)
+        if ids:
+            params["id"] = list(ids)
+        if created_after is not None:
+            params["createdAfter"] = _format_date(created_after)
+        if created_before is not None:
+            params["createdBefore"] = _format_date(created_before)
+
+        skip = 0
+        while True:
+            params["skip"] = skip
+            params["accessToken"] = self.vi_access_token
+
+            response = self._request("GET", url, params=params)
+
+            response.raise_for_status()
 
-        return search_result["results"]
+            search_result = response.json()
+            results = search_result.get("results", [])
+            if results:
+                yield results
+
+            next_page = search_result.get("nextPage") or {}
+            if next_page.get("done", True) or not results:
+                break
+            skip = next_page.get("skip", skip + len(results))
+
+    def iter_videos(self, **kwargs) -> Iterator[dict]:
+        """
+        Lists the videos in the account, fetching further pages as the iterator advances.
+        Accepts the same arguments as `iter_video_pages`.
+
+        :return: Iterator over video entries
+        """
+        for page in self.iter_video_pages(**kwargs):
+            yield from page
+
+    def get_video_entry(self, video_id: str) -> Optional[dict]:
+        """
+        Gets the list entry (name, state, last modified time, etc.) of a single video,
+        without downloading its index.
+
+        :param video_id: The video ID
+        :return: The video entry, or None if the video does not exist
+        """
+        return next(self.iter_videos(ids=[video_id], page_size=1), None)
+
+    def list_videos_async(self, **kwargs) -> list[dict]:
+        """
+        Lists all videos in the account.
+        Accepts the same arguments as `iter_video_pages`.
+
+        :return: List of video entries
+        """
+        return list(self.iter_videos(**kwargs))
 
     def generate_prompt_content_async(self, video_id: str) -> None:
         """
@@ -399,7 +896,10 @@ class VideoIndexerClient:
 
         params = {"accessToken": self.vi_access_token}
 
-        response = requests.post(url, headers=headers, params=params)
+        # Generation replaces any previous prompt content, so the request is safe to repeat
+        response = self._request(
+            "POST", url, headers=headers, params=params, idempotent=True
+        )
 
         response.raise_for_status()
         print(f"Prompt content generation for {video_id=} started...")
@@ -427,7 +927,7 @@ class VideoIndexerClient:
 
         params = {"accessToken": self.vi_access_token}
 
-        response = requests.get(url, params=params)
+        response = self._request("GET", url, params=params)
         if not raise_on_not_found and response.status_code == 404:
             return None
 
@@ -447,34 +947,149 @@ class VideoIndexerClient:
         :param check_alreay_exists: If True, checks if the prompt content already exists
         :return: The prompt content for the video, otherwise None
         """
-
-        if check_alreay_exists:
-            prompt_content = self.get_prompt_content_async(
-                video_id, raise_on_not_found=False
-            )
-            if prompt_content is not None:
-                print(f"Prompt content already exists for video ID {video_id}.")
-                return prompt_content
-
-        self.generate_prompt_content_async(video_id)
-
-        start_time = time.time()
-        prompt_content = None
-        while prompt_content is None:
-            prompt_content = self.get_prompt_content_async(
-                video_id, raise_on_not_found=False
+        _, prompt_content = next(
+            self.iter_prompt_contents(
+                [video_id], timeout_sec=timeout_sec, regenerate=not check_alreay_exists
             )
+        )
+        return prompt_content
 
-            if timeout_sec is not None and time.time() - start_time > timeout_sec:
-                print(f"Timeout of {timeout_sec} seconds reached. Exiting...")
-                break
+    def _get_prompt_content_versions(self, video_ids: list[str]) -> dict[str, str]:
+        versions = {}
+        for i in range(0, len(video_ids), DEFAULT_LIST_PAGE_SIZE):
+            ids = video_ids[i : i + DEFAULT_LIST_PAGE_SIZE]
+            for video in self.iter_videos(ids=ids, page_size=len(ids)):
+                versions[video["id"]] = video.get("lastModified")
+        return versions
 
-            print(
-                "Prompt content is not ready yet. Waiting 5 seconds before checking again..."
-            )
-            time.sleep(10)
+    def iter_prompt_contents(
+        self,
+        video_ids: Iterable[str],
+        timeout_sec: Optional[float] = None,
+        regenerate: bool = False,
+        cache=None,
+        max_workers: int = DEFAULT_PROMPT_CONTENT_WORKERS,
+        versions: Optional[dict[str, str]] = None,
+    ) -> Iterator[tuple[str, Optional[dict]]]:
+        """
+        Gets the prompt content of many videos, generating it where it does not exist yet. Generation
+        is started for all videos up front, then all pending videos are checked for at exponentially
+        growing intervals (see PROMPT_CONTENT_POLL_INITIAL_SEC), in parallel, until a common deadline.
+
+        :param video_ids: The video IDs
+        :param timeout_sec: Deadline for all videos, in seconds. If not provided, waits indefinitely
+        :param regenerate: If True, generates new prompt content even if it already exists
+        :param cache: Prompt content cache with `get(key)` and `put(key, content)`, e.g.
+            `content_cache.BlobContentCache`. Entries are keyed by video ID and last modified time,
+            so re-indexed videos get new prompt content
+        :param max_workers: Number of requests sent in parallel
+        :param versions: Last modified time of each video, if already known from its list entry;
+            otherwise it is listed for the cache keys
+        :return: Generator of (video ID, prompt content) as each video's content is ready, then
+            (video ID, None) for the videos that failed or were not ready before the deadline
+        """
+        video_ids = list(dict.fromkeys(video_ids))
+        deadline = time.monotonic() + timeout_sec if timeout_sec is not None else None
+
+        cache_keys = {}
+        if cache is not None:
+            if versions is None:
+                versions = self._get_prompt_content_versions(video_ids)
+            cache_keys = {
+                video_id: video_cache_key(
+                    PROMPT_CONTENT_KIND, video_id, versions.get(video_id)
+                )
+                for video_id in video_ids
+            }
+
+        def start(video_id: str) -> Optional[dict]:
+            if video_id in cache_keys:
+                prompt_content = cache.get(cache_keys[video_id])
+                if prompt_content is not None:
+                    return prompt_content
+            if not regenerate:
+                prompt_content = self.get_prompt_content_async(
+                    video_id, raise_on_not_found=False
+                )
+                if prompt_content is not None:
+                    return prompt_content
+            self.generate_prompt_content_async(video_id)
+            return None
 
-        return prompt_content
+        def check(video_id: str) -> Optional[dict]:
+            return self.get_prompt_content_async(video_id, raise_on_not_found=False)
+
+        def ready(video_id: str, prompt_content: dict) -> tuple[str, dict]:
+            if video_id in cache_keys:
+                cache.put(cache_keys[video_id], prompt_content)
+            return video_id, prompt_content
+
+        # Next check time and current interval of each video whose prompt content is being generated
+        pending = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(start, video_id): video_id for video_id in video_ids}
+            for future in as_completed(futures):
+                video_id = futures[future]
+                try:
+                    prompt_content = future.result()
+                except Exception as e:
+                    logging.warning(f"Could not get prompt content for video ID {video_id}: {e}")
+                    yield video_id, None
+                    continue
+                if prompt_content is not None:
+                    yield ready(video_id, prompt_content)
+                else:
+                    interval = PROMPT_CONTENT_POLL_INITIAL_SEC
+                    pending[video_id] = (time.monotonic() + interval, interval)
+
+            while pending:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    print(f"Timeout of {timeout_sec} seconds reached. Exiting...")
+                    break
+
+                due = [
+                    video_id for video_id, (check_at, _) in pending.items() if check_at <= now
+                ]
+                if not due:
+                    next_check = min(check_at for check_at, _ in pending.values())
+                    if deadline is not None:
+                        next_check = min(next_check, deadline)
+                    time.sleep(max(0.0, next_check - now))
+                    continue
+
+                futures = {executor.submit(check, video_id): video_id for video_id in due}
+                for future in as_completed(futures):
+                    video_id = futures[future]
+                    try:
+                        prompt_content = future.result()
+                    except Exception as e:
+                        logging.warning(
+                            f"Could not get prompt content for video ID {video_id}: {e}"
+                        )
+                        del pending[video_id]
+                        yield video_id, None
+                        continue
+                    if prompt_content is not None:
+                        del pending[video_id]
+                        yield ready(video_id, prompt_content)
+                        continue
+
+                    # Not ready yet: check again later, with jitter so checks spread out
+                    interval = min(pending[video_id][1] * 2, PROMPT_CONTENT_POLL_MAX_SEC)
+                    pending[video_id] = (
+                        time.monotonic() + interval * random.uniform(0.8, 1.2),
+                        interval,
+                    )
+
+                if pending:
+                    print(
+                        f"Prompt content is not ready yet for {len(pending)} videos. "
+                        + "Checking again with backoff..."
+                    )
+
+        for video_id in pending:
+            yield video_id, None
 
     def get_insights_widgets_url_async(
         self, video_id: str, widget_type: str, allow_edit: bool = False
@@ -482,7 +1097,7 @@ class VideoIndexerClient:
         """
         Calls the getVideoInsightsWidget API
         (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=Get-Video-Insights-Widget)
-        It first generates a new access token for the video scope.
+        It first gets an access token for the video scope.
         Prints the VideoInsightsWidget URL, otherwise throws exception.
 
         :param video_id: The video ID
@@ -491,13 +1106,9 @@ class VideoIndexerClient:
         """
         self.get_account_async()  # if account is not initialized, get it
 
-        # generate a new access token for the video scope
-        video_scope_access_token = get_account_access_token_async(
-            self.consts,
-            self.arm_access_token,
-            permission_type="Contributor",
-            scope="Video",
-            video_id=video_id,
+        # get an access token for the video scope, cached until it is about to expire
+        video_scope_access_token = self.tokens.get_vi_token(
+            permission_type="Contributor", scope="Video", video_id=video_id
         )
 
         print(f"Getting the insights widget URL for video {video_id}")
@@ -513,7 +1124,7 @@ class VideoIndexerClient:
             + f"Videos/{video_id}/InsightsWidget"
         )
 
-        response = requests.get(url, params=params)
+        response = self._request("GET", url, params=params)
 
         response.raise_for_status()
 
@@ -524,20 +1135,16 @@ class VideoIndexerClient:
         """
         Calls the getVideoPlayerWidget API
         (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=Get-Video-Player-Widget)
-        It first generates a new access token for the video scope.
+        It first gets an access token for the video scope.
         Prints the VideoPlayerWidget URL, otherwise throws exception
 
         :param video_id: The video ID
         """
         self.get_account_async()
 
-        # generate a new access token for the video scope
-        video_scope_access_token = get_account_access_token_async(
-            self.consts,
-            self.arm_access_token,
-            permission_type="Contributor",
-            scope="Video",
-            video_id=video_id,
+        # get an access token for the video scope, cached until it is about to expire
+        video_scope_access_token = self.tokens.get_vi_token(
+            permission_type="Contributor", scope="Video", video_id=video_id
         )
 
         print(f"Getting the player widget URL for video {video_id}")
@@ -549,7 +1156,7 @@ class VideoIndexerClient:
             + f"Videos/{video_id}/PlayerWidget"
         )
 
-        response = requests.get(url, params=params)
+        response = self._request("GET", url, params=params)
 
         response.raise_for_status()
 
@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+import math
+
+
+DEFAULT_MAX_TOKENS = 512
+DEFAULT_OVERLAP_FRAGMENTS = 1
+DEFAULT_MAX_GAP_SECONDS = 5.0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens of English text (about four characters per token),
+    without depending on a tokenizer
+
+    :param text: The text
+    :return: Estimated number of tokens
+    """
+    return max(1, math.ceil(len(text) / 4))
+
+
+@dataclass
+class Chunk:
+    text: str
+    start: str
+    end: str
+    start_seconds: float
+    end_seconds: float
+    fragment_count: int
+
+
+def _make_chunk(fragments: list[dict]) -> Chunk:
+    return Chunk(
+        text=" ".join(fragment["text"] for fragment in fragments),
+        start=fragments[0]["start"],
+        end=fragments[-1]["end"],
+        start_seconds=fragments[0]["start_seconds"],
+        end_seconds=fragments[-1]["end_seconds"],
+        fragment_count=len(fragments),
+    )
+
+
+def chunk_fragments(
+    fragments: Iterable[dict],
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    overlap_fragments: int = DEFAULT_OVERLAP_FRAGMENTS,
+    max_gap_seconds: float = DEFAULT_MAX_GAP_SECONDS,
+    token_counter: Callable[[str], int] = estimate_tokens,
+) -> Iterator[Chunk]:
+    """
+    Groups consecutive transcript fragments into chunks of at most `max_tokens` tokens, without ever
+    splitting a fragment. A chunk also ends at a pause longer than `max_gap_seconds`, and at a change
+    of speaker once it is at least half full, so chunks follow the flow of the conversation.
+    When a chunk ends because of its token budget, the next one repeats its last `overlap_fragments`
+    fragments for context; chunks ending at a pause or speaker change do not overlap.
+
+    :param fragments: Fragments with `text`, `start`, `end`, `start_seconds`, `end_seconds` and
+        optionally `speaker_id`, as produced by `transcripts.normalize_fragment`
+    :param max_tokens: Token budget of a chunk. A single fragment above the budget becomes its own chunk
+    :param overlap_fragments: Number of fragments repeated at the start of the next chunk
+    :param max_gap_seconds: Pause between fragments that always ends a chunk
+    :param token_counter: Function counting the tokens of a text
+    :return: Iterator over the chunks, in transcript order
+    """
+    current: list[dict] = []
+    current_tokens = 0
+
+    for fragment in fragments:
+        tokens = token_counter(fragment["text"])
+
+        if current:
+            previous = current[-1]
+            over_budget = current_tokens + tokens > max_tokens
+            pause = fragment["start_seconds"] - previous["end_seconds"] > max_gap_seconds
+            speaker_change = (
+                fragment.get("speaker_id") != previous.get("speaker_id")
+                and current_tokens >= max_tokens / 2
+            )
+
+            if over_budget or pause or speaker_change:
+                yield _make_chunk(current)
+
+                overlap = (
+                    current[-overlap_fragments:]
+                    if over_budget and not pause and overlap_fragments > 0
+                    else []
+                )
+                overlap_tokens = sum(token_counter(f["text"]) for f in overlap)
+                # Never let the overlap push the next chunk over its budget
+                if overlap_tokens + tokens > max_tokens:
+                    overlap, overlap_tokens = [], 0
+                current, current_tokens = list(overlap), overlap_tokens
+
+        current.append(fragment)
+        current_tokens += tokens
+
+    if current:
+        yield _make_chunk(current)
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContainerClient
+
+
+def video_cache_key(kind: str, video_id: str, qualifier: Optional[str]) -> str:
+    """
+    :param kind: Kind of cached content, e.g. "prompt-content"
+    :param video_id: The video ID
+    :param qualifier: What else the content depends on, e.g. the `lastModified` time of the
+        video's index, so content of a re-indexed video is never served from the cache, or its language
+    :return: Cache key
+    """
+    return hashlib.sha256(f"{kind}\n{video_id}\n{qualifier}".encode("utf-8")).hexdigest()
+
+
+class LocalContentCache:
+    """
+    Cache of JSON content in a local directory, one file per cache key. With a size limit, the
+    least recently used entries are evicted once the files exceed it.
+    """
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None) -> None:
+        """
+        :param directory: Directory of the cache, shared across runs
+        :param max_bytes: Maximum total size of the cached files. If not provided, nothing is evicted
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        # Size of each cached file, least recently used first; files are touched when read
+        self._lock = threading.Lock()
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        if max_bytes is not None:
+            files = []
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    if name.endswith(".json"):
+                        stat = os.stat(os.path.join(root, name))
+                        files.append((stat.st_mtime, os.path.join(root, name), stat.st_size))
+            for _, path, size in sorted(files):
+                self._sizes[path] = size
+                self._total_bytes += size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                content = json.load(file)
+        except FileNotFoundError:
+            return None
+
+        if self.max_bytes is not None:
+            os.utime(path)
+            with self._lock:
+                if path in self._sizes:
+                    self._sizes.move_to_end(path)
+        return content
+
+    def put(self, key: str, content: dict) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so concurrent readers never see a partial file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(content, file, ensure_ascii=False)
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, path)
+
+        if self.max_bytes is not None:
+            self._evict(path, size)
+
+    def _evict(self, path: str, size: int) -> None:
+        with self._lock:
+            self._total_bytes += size - self._sizes.pop(path, 0)
+            self._sizes[path] = size
+
+            # The entry just written is kept even if it alone exceeds the limit
+            while self._total_bytes > self.max_bytes and len(self._sizes) > 1:
+                evicted_path, evicted_size = self._sizes.popitem(last=False)
+                self._total_bytes -= evicted_size
+                try:
+                    os.remove(evicted_path)
+                except FileNotFoundError:
+                    pass
+                logging.debug(f"Evicted {evicted_path} from the cache.")
+
+
+class BlobContentCache:
+    """
+    Cache of JSON content in blob storage, one blob per cache key. Blobs are not evicted; expire
+    them with a lifecycle management rule on the prefix if needed.
+    """
+
+    def __init__(self, container_client: ContainerClient, prefix: str) -> None:
+        self.container_client = container_client
+        self.prefix = prefix
+
+    def _blob_name(self, key: str) -> str:
+        return f"{self.prefix}{key[:2]}/{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            data = self.container_client.download_blob(self._blob_name(key)).readall()
+        except ResourceNotFoundError:
+            return None
+        return json.loads(data)
+
+    def put(self, key: str, content: dict) -> None:
+        self.container_client.upload_blob(
+            self._blob_name(key),
+            json.dumps(content, ensure_ascii=False).encode("utf-8"),
+            overwrite=True,
+        )
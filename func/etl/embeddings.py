@@ -0,0 +1,265 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, Protocol
+import hashlib
+import logging
+import math
+import os
+import re
+
+from azure.core.credentials import TokenCredential
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContainerClient
+import requests
+
+from request_policy import RateLimiter, RequestPolicy
+
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-large"
+DEFAULT_EMBEDDING_DIMENSIONS = 1024
+# Azure OpenAI accepts up to 2048 inputs per embedding request; fewer, larger requests use less of
+# the deployment's requests-per-minute quota
+DEFAULT_EMBEDDING_BATCH_SIZE = 128
+# Azure OpenAI quotas are set per deployment, independently of the Video Indexer limits
+DEFAULT_EMBEDDING_REQUESTS_PER_SECOND = 5.0
+OPENAI_API_VERSION = "2024-02-01"
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+
+class Embedder(Protocol):
+    model: str
+    dimensions: int
+
+    def embed(self, texts: list[str]) -> list[list[float]]: ...
+
+
+class AzureOpenAIEmbedder:
+    """
+    Embeds texts with an Azure OpenAI embedding deployment, many texts per request.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        credential: TokenCredential,
+        deployment: str = DEFAULT_EMBEDDING_MODEL,
+        model: str = DEFAULT_EMBEDDING_MODEL,
+        dimensions: int = DEFAULT_EMBEDDING_DIMENSIONS,
+        session: Optional[requests.Session] = None,
+        request_policy: Optional[RequestPolicy] = None,
+    ) -> None:
+        """
+        :param endpoint: Azure OpenAI resource URL, e.g. https://<name>.openai.azure.com
+        :param credential: Credential with access to the Azure OpenAI resource
+        :param deployment: Name of the embedding deployment
+        :param model: Name of the embedding model, part of the cache key
+        :param dimensions: Number of dimensions of the embeddings
+        :param session: Session to send the requests with
+        :param request_policy: Policy to rate limit and retry the requests with. If not provided,
+            requests are limited to `DEFAULT_EMBEDDING_REQUESTS_PER_SECOND`
+        """
+        self.url = (
+            f"{endpoint.rstrip('/')}/openai/deployments/{deployment}/embeddings"
+            + f"?api-version={OPENAI_API_VERSION}"
+        )
+        self.credential = credential
+        self.model = model
+        self.dimensions = dimensions
+        self.session = session if session is not None else requests.Session()
+        self.request_policy = (
+            request_policy
+            if request_policy is not None
+            else RequestPolicy(
+                rate_limiter=RateLimiter(
+                    DEFAULT_EMBEDDING_REQUESTS_PER_SECOND,
+                    burst=int(DEFAULT_EMBEDDING_REQUESTS_PER_SECOND),
+                )
+            )
+        )
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """
+        :param texts: Texts to embed, in a single request
+        :return: One embedding per text, in the same order
+        """
+        headers = {
+            "Authorization": "Bearer "
+            + self.credential.get_token(COGNITIVE_SERVICES_SCOPE).token,
+            "Content-Type": "application/json",
+        }
+        response = self.request_policy.send(
+            self.session.request,
+            "POST",
+            self.url,
+            headers=headers,
+            json={"input": texts, "dimensions": self.dimensions},
+        )
+        response.raise_for_status()
+
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+
+class HashingEmbedder:
+    """
+    Local stand-in for an embedding model: deterministic, normalized bag-of-words vectors built by
+    feature hashing. Texts sharing words get similar vectors, which is enough to exercise the pipeline
+    and retrieval without calling Azure OpenAI.
+    """
+
+    def __init__(self, dimensions: int = DEFAULT_EMBEDDING_DIMENSIONS) -> None:
+        self.model = "local-hashing"
+        self.dimensions = dimensions
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        embeddings = []
+        for text in texts:
+            vector = [0.0] * self.dimensions
+            for word in re.findall(r"\w+", text.lower()):
+                digest = hashlib.md5(word.encode("utf-8")).digest()
+                index = int.from_bytes(digest[:4], "little") % self.dimensions
+                vector[index] += 1.0 if digest[4] % 2 else -1.0
+            norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+            embeddings.append([value / norm for value in vector])
+        return embeddings
+
+
+def embedding_cache_key(model: str, dimensions: int, text: str) -> str:
+    """
+    :return: Content hash identifying the embedding of `text` by `model` with `dimensions`
+    """
+    return hashlib.sha256(f"{model}\n{dimensions}\n{text}".encode("utf-8")).hexdigest()
+
+
+def _pack(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(data: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class LocalEmbeddingCache:
+    """
+    Embedding cache in a local directory, one float32 file per cache key.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, list[float]]:
+        found = {}
+        for key in keys:
+            try:
+                with open(self._path(key), "rb") as file:
+                    found[key] = _unpack(file.read())
+            except FileNotFoundError:
+                pass
+        return found
+
+    def put_many(self, embeddings: dict[str, list[float]]) -> None:
+        for key, vector in embeddings.items():
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(_pack(vector))
+
+
+class BlobEmbeddingCache:
+    """
+    Embedding cache in blob storage, one float32 blob per cache key, read and written in parallel.
+    """
+
+    def __init__(
+        self,
+        container_client: ContainerClient,
+        prefix: str = "embeddings/",
+        max_workers: int = 8,
+    ) -> None:
+        self.container_client = container_client
+        self.prefix = prefix
+        self.max_workers = max_workers
+
+    def _blob_name(self, key: str) -> str:
+        return f"{self.prefix}{key[:2]}/{key}"
+
+    def _get(self, key: str) -> Optional[list[float]]:
+        try:
+            data = self.container_client.download_blob(self._blob_name(key)).readall()
+        except ResourceNotFoundError:
+            return None
+        return _unpack(data)
+
+    def _put(self, item: tuple[str, list[float]]) -> None:
+        key, vector = item
+        self.container_client.upload_blob(
+            self._blob_name(key), _pack(vector), overwrite=True
+        )
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, list[float]]:
+        keys = list(keys)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            vectors = executor.map(self._get, keys)
+        return {key: vector for key, vector in zip(keys, vectors) if vector is not None}
+
+    def put_many(self, embeddings: dict[str, list[float]]) -> None:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(self._put, embeddings.items()))
+
+
+def embed_documents(
+    documents: list[dict],
+    embedder: Embedder,
+    cache=None,
+    batch_size: int = DEFAULT_EMBEDDING_BATCH_SIZE,
+    text_field: str = "chunk",
+    vector_field: str = "text_vector",
+) -> list[dict]:
+    """
+    Adds embeddings to documents. Embeddings are looked up in the cache by a hash of the model,
+    dimensions and text, so unchanged chunks are never embedded again; the remaining texts are
+    embedded `batch_size` at a time and added to the cache.
+
+    :param documents: Documents to embed, modified in place
+    :param embedder: Embedding model, e.g. `AzureOpenAIEmbedder` or `HashingEmbedder`
+    :param cache: Embedding cache, e.g. `BlobEmbeddingCache`. If not provided, everything is embedded
+    :param batch_size: Number of texts per embedding request
+    :param text_field: Field holding the text to embed
+    :param vector_field: Field to store the embedding in
+    :return: The documents
+    """
+    keys = [
+        embedding_cache_key(embedder.model, embedder.dimensions, document[text_field])
+        for document in documents
+    ]
+    vectors = cache.get_many(set(keys)) if cache is not None else {}
+
+    # Embed each distinct missing text once
+    missing = {}
+    for key, document in zip(keys, documents):
+        if key not in vectors:
+            missing.setdefault(key, document[text_field])
+    missing_keys = list(missing)
+
+    embedded = {}
+    for i in range(0, len(missing_keys), batch_size):
+        batch_keys = missing_keys[i : i + batch_size]
+        batch_vectors = embedder.embed([missing[key] for key in batch_keys])
+        embedded.update(zip(batch_keys, batch_vectors))
+
+    if cache is not None and embedded:
+        cache.put_many(embedded)
+    vectors.update(embedded)
+
+    logging.info(
+        f"Embedded {len(embedded)} of {len(documents)} chunks; the rest came from the cache."
+    )
+    for key, document in zip(keys, documents):
+        document[vector_field] = vectors[key]
+    return documents
@@ -0,0 +1,838 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Iterable, Mapping, Optional, Union
+import io
+import logging
+import os
+import tempfile
+import threading
+
+from azure.appconfiguration.provider import load
+from azure.core.credentials import TokenCredential
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.identity import DefaultAzureCredential
+from azure.search.documents import SearchClient
+from azure.storage.blob import BlobServiceClient, ContainerClient, ContentSettings
+import requests
+
+from avi_helpers import DEFAULT_LIST_PAGE_SIZE, Consts, VideoIndexerClient
+from chunking import (
+    DEFAULT_MAX_GAP_SECONDS,
+    DEFAULT_MAX_TOKENS,
+    DEFAULT_OVERLAP_FRAGMENTS,
+)
+from content_cache import BlobContentCache, LocalContentCache
+from embeddings import (
+    DEFAULT_EMBEDDING_BATCH_SIZE,
+    DEFAULT_EMBEDDING_DIMENSIONS,
+    DEFAULT_EMBEDDING_MODEL,
+    DEFAULT_EMBEDDING_REQUESTS_PER_SECOND,
+    AzureOpenAIEmbedder,
+    BlobEmbeddingCache,
+    Embedder,
+    HashingEmbedder,
+    embed_documents,
+)
+from indexing import delete_stale_documents, upload_documents
+from manifest import TranscriptManifest
+from request_policy import DEFAULT_REQUESTS_PER_SECOND, RateLimiter, RequestPolicy
+from transcripts import (
+    TRANSCRIPT_FORMATS,
+    chunk_documents,
+    prompt_content_sections,
+    section_documents,
+    transcript_blob_name,
+    write_transcript_blob,
+)
+
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_INDEX_NAME = "rag-transcript-index"
+DEFAULT_STATE_CONTAINER_NAME = "etl-state"
+# Single-blob manifest of earlier versions, imported into the per-video entries on the next sweep
+LEGACY_MANIFEST_BLOB_NAME = "transcripts-manifest.json"
+
+# What the ETL ingests (`ETLSourceMode` setting):
+# - "transcript": the transcript fragments of the video index, in the `TranscriptFormat` format
+# - "prompt_content": Video Indexer's prompt content, sections of the video with their time range,
+#   transcript and visual/audio insights, written and indexed as one document per section
+SOURCE_MODES = ["transcript", "prompt_content"]
+# Kept well under the function timeout (5 minutes on the Consumption plan); a video whose prompt
+# content is not ready by then fails and is retried later, while generation carries on
+DEFAULT_PROMPT_CONTENT_TIMEOUT_SEC = 60
+# Such a video is deferred: enqueued to be extracted again after a delay doubling with each attempt,
+# up to `PromptContentMaxAttempts` times
+PROMPT_CONTENT_RETRY_DELAY_SEC = 120
+PROMPT_CONTENT_MAX_RETRY_DELAY_SEC = 3600
+DEFAULT_PROMPT_CONTENT_MAX_ATTEMPTS = 8
+PROMPT_CONTENT_CACHE_PREFIX = "prompt-content/"
+
+# Cache of extracted transcripts (`TranscriptCache` setting: "none", "local" or "blob"), so
+# backfills and format changes reprocess the library without downloading every index again
+TRANSCRIPT_CACHE_PREFIX = "transcripts-cache/"
+# The app's own directory is read-only when run from a package, so the local cache lives in temp storage
+DEFAULT_TRANSCRIPT_CACHE_DIRECTORY = os.path.join(tempfile.gettempdir(), "transcript-cache")
+DEFAULT_TRANSCRIPT_CACHE_MAX_MB = 1024
+
+
+class PromptContentNotReadyError(TimeoutError):
+    """
+    Raised when a video's prompt content is not ready in time; its generation carries on
+    """
+
+
+def prompt_content_retry_delay(attempt: int) -> int:
+    """
+    :param attempt: Number of times the video was deferred, including this one
+    :return: Seconds to wait before extracting a deferred video again
+    """
+    return min(
+        PROMPT_CONTENT_RETRY_DELAY_SEC * 2 ** (attempt - 1),
+        PROMPT_CONTENT_MAX_RETRY_DELAY_SEC,
+    )
+
+
+@dataclass
+class EtlContext:
+    """
+    Configuration and clients shared by the ETL functions.
+    """
+
+    config: Mapping
+    avi_client: VideoIndexerClient
+    blob_service_client: BlobServiceClient
+    max_workers: int
+    # Set in push mode, where chunks are embedded by the ETL and uploaded to the index directly
+    search_client: Optional[SearchClient] = None
+    embedder: Optional[Embedder] = None
+    embedding_cache: Optional[BlobEmbeddingCache] = None
+    # Set in prompt content mode
+    prompt_content_cache: Optional[BlobContentCache] = None
+    transcript_cache: Optional[Union[LocalContentCache, BlobContentCache]] = None
+
+    @property
+    def transcripts_container_name(self) -> str:
+        return self.config["TranscriptsStorageContainerName"]
+
+    @property
+    def source_mode(self) -> str:
+        source_mode = self.config.get("ETLSourceMode", "transcript")
+        if source_mode not in SOURCE_MODES:
+            raise ValueError(
+                f"Unknown ETLSourceMode {source_mode}. Expected one of {SOURCE_MODES}."
+            )
+        return source_mode
+
+    @property
+    def transcript_format(self) -> str:
+        if self.source_mode == "prompt_content":
+            return "sections"
+        transcript_format = self.config.get("TranscriptFormat", "text")
+        if transcript_format not in TRANSCRIPT_FORMATS:
+            raise ValueError(
+                f"Unknown TranscriptFormat {transcript_format}. Expected one of {list(TRANSCRIPT_FORMATS)}."
+            )
+        return transcript_format
+
+    @property
+    def compress_transcripts(self) -> bool:
+        return str(self.config.get("TranscriptCompression", "none")).lower() == "gzip"
+
+    @property
+    def content_encoding(self) -> Optional[str]:
+        return "gzip" if self.compress_transcripts else None
+
+    @property
+    def transcript_format_options(self) -> dict:
+        return self.chunk_options if self.transcript_format == "chunks" else {}
+
+    @property
+    def chunk_options(self) -> dict:
+        return {
+            "max_tokens": int(self.config.get("ChunkMaxTokens", DEFAULT_MAX_TOKENS)),
+            "overlap_fragments": int(
+                self.config.get("ChunkOverlapFragments", DEFAULT_OVERLAP_FRAGMENTS)
+            ),
+            "max_gap_seconds": float(
+                self.config.get("ChunkMaxGapSeconds", DEFAULT_MAX_GAP_SECONDS)
+            ),
+        }
+
+    def transcript_blob_name(self, video_name: str) -> str:
+        return transcript_blob_name(video_name, self.transcript_format)
+
+    @property
+    def incremental(self) -> bool:
+        return str(self.config.get("ETLIncremental", "true")).lower() == "true"
+
+    def get_state_container_client(self) -> ContainerClient:
+        """
+        Gets the container holding the ETL state (manifest, run tallies), creating it on first use.
+
+        :return: Container client for the ETL state container
+        """
+        container_client = self.blob_service_client.get_container_client(
+            self.config.get("ETLStateContainerName", DEFAULT_STATE_CONTAINER_NAME)
+        )
+        try:
+            container_client.create_container()
+        except ResourceExistsError:
+            pass
+        return container_client
+
+    def load_manifest(self, preload: bool = True) -> Optional[TranscriptManifest]:
+        """
+        Loads the transcript manifest.
+
+        :param preload: Whether to read all entries at once, for sweeps over the library. Otherwise
+            entries are read on first use, for runs touching a few videos
+        :return: The transcript manifest, or None if the ETL is not in incremental mode
+        """
+        if not self.incremental:
+            return None
+
+        container_client = self.get_state_container_client()
+        if not preload:
+            return TranscriptManifest(container_client)
+        return TranscriptManifest.load(
+            container_client, legacy_blob_name=LEGACY_MANIFEST_BLOB_NAME
+        )
+
+
+def load_configuration(credential: TokenCredential) -> Mapping:
+    """
+    Loads the configuration from Azure App Configuration.
+
+    :param credential: Credential with access to the App Configuration store
+    :return: Configuration
+    """
+    endpoint = os.environ.get("AZURE_APPCONFIG_ENDPOINT")
+    logging.info("Loading configuration from Azure App Configuration.")
+    logging.debug(f"Endpoint: {endpoint}")
+
+    config = load(endpoint=endpoint, credential=credential)
+    logging.info("Configuration loaded successfully.")
+    logging.debug(f"Configuration: {config}")
+    return config
+
+
+def create_embedder(
+    config: Mapping,
+    credential: TokenCredential,
+    session: Optional[requests.Session] = None,
+) -> Embedder:
+    """
+    Creates the embedding model of the index's chunks (`EmbeddingProvider` setting).
+
+    :param config: Configuration
+    :param credential: Credential with access to the Azure OpenAI resource
+    :param session: Session to send the requests with
+    :return: Embedding model
+    """
+    dimensions = int(config.get("EmbeddingDimensions", DEFAULT_EMBEDDING_DIMENSIONS))
+    if config.get("EmbeddingProvider", "azure_openai") == "local":
+        return HashingEmbedder(dimensions)
+
+    requests_per_second = float(
+        config.get("EmbeddingRequestsPerSecond", DEFAULT_EMBEDDING_REQUESTS_PER_SECOND)
+    )
+    return AzureOpenAIEmbedder(
+        config["OpenAIEndpoint"],
+        credential,
+        deployment=config.get("EmbeddingDeployment", DEFAULT_EMBEDDING_MODEL),
+        model=config.get("EmbeddingModel", DEFAULT_EMBEDDING_MODEL),
+        dimensions=dimensions,
+        session=session,
+        request_policy=RequestPolicy(
+            rate_limiter=RateLimiter(
+                requests_per_second, burst=max(1, int(requests_per_second))
+            )
+        ),
+    )
+
+
+def create_etl_context() -> EtlContext:
+    """
+    Loads the configuration from Azure App Configuration and creates the authenticated clients.
+
+    :return: ETL context
+    """
+    credential = DefaultAzureCredential()
+    config = load_configuration(credential)
+
+    # Create Video Indexer Client & authenticate
+    consts = Consts(
+        config["AVIResourceName"],
+        config["AVIResourceGroup"],
+        config["AVISubscriptionID"],
+    )
+    max_workers = int(config.get("ETLMaxWorkers", DEFAULT_MAX_WORKERS))
+    requests_per_second = float(
+        config.get("AVIRequestsPerSecond", DEFAULT_REQUESTS_PER_SECOND)
+    )
+    avi_client = VideoIndexerClient(
+        pool_maxsize=max_workers,
+        request_policy=RequestPolicy(
+            rate_limiter=RateLimiter(
+                requests_per_second, burst=max(1, int(requests_per_second))
+            )
+        ),
+    )
+    avi_client.authenticate_async(consts)
+    logging.info("Authenticated with Video Indexer successfully.")
+
+    # Create Blob Service & Container Clients
+    blob_service_client = BlobServiceClient(
+        config["TranscriptsStorageURL"], credential=credential
+    )
+    logging.info("Blob service client created successfully.")
+
+    context = EtlContext(config, avi_client, blob_service_client, max_workers)
+
+    # In push mode, create the embedding model, its cache and the search client
+    if str(config.get("SearchPushMode", "false")).lower() == "true":
+        context.embedder = create_embedder(config, credential, avi_client.session)
+        context.embedding_cache = BlobEmbeddingCache(
+            context.get_state_container_client()
+        )
+        context.search_client = SearchClient(
+            config["SearchEndpoint"],
+            config.get("SearchIndexName", DEFAULT_INDEX_NAME),
+            credential,
+        )
+        logging.info("Search push mode enabled.")
+
+    transcript_cache = str(config.get("TranscriptCache", "none")).lower()
+    if transcript_cache == "local":
+        context.transcript_cache = LocalContentCache(
+            config.get("TranscriptCacheDirectory", DEFAULT_TRANSCRIPT_CACHE_DIRECTORY),
+            max_bytes=int(
+                config.get("TranscriptCacheMaxMB", DEFAULT_TRANSCRIPT_CACHE_MAX_MB)
+            )
+            * 1024
+            * 1024,
+        )
+    elif transcript_cache == "blob":
+        context.transcript_cache = BlobContentCache(
+            context.get_state_container_client(), TRANSCRIPT_CACHE_PREFIX
+        )
+
+    if context.source_mode == "prompt_content":
+        context.prompt_content_cache = BlobContentCache(
+            context.get_state_container_client(), PROMPT_CONTENT_CACHE_PREFIX
+        )
+        logging.info("Prompt content source mode enabled.")
+
+    return context
+
+
+_context: Optional[EtlContext] = None
+_context_lock = threading.Lock()
+
+
+def get_etl_context() -> EtlContext:
+    """
+    Gets the ETL context, creating it once per worker process so warm invocations reuse the
+    configuration, the pooled session and the cached access tokens.
+
+    :return: ETL context
+    """
+    global _context
+    with _context_lock:
+        if _context is None:
+            _context = create_etl_context()
+        return _context
+
+
+def process_video(
+    context: EtlContext,
+    video: dict,
+    manifest: Optional[TranscriptManifest] = None,
+    existing_transcripts: Optional[dict[str, dict]] = None,
+) -> str:
+    """
+    Extracts the transcript of a single video and uploads it to blob storage.
+
+    :param context: ETL context
+    :param video: Video entry as returned by `list_videos_async`
+    :param manifest: Manifest of previous runs. If provided, unchanged videos are skipped without any API call
+    :param existing_transcripts: Transcript blobs listed at the start of the run, as returned by
+        `list_existing_transcripts`. If provided, it replaces the per-video existence check
+    :return: "processed" if a transcript was uploaded, otherwise "skipped"
+    """
+    # Get video details
+    video_name = video["name"]
+    video_id = video["id"]
+
+    file_name = context.transcript_blob_name(video_name)
+    push_mode = context.search_client is not None
+
+    # In incremental mode, skip videos that have not changed since they were last extracted
+    # (and, in push mode, indexed)
+    if manifest is not None and not manifest.needs_processing(
+        video,
+        file_name,
+        require_indexed=push_mode,
+        content_encoding=context.content_encoding,
+    ):
+        logging.debug(f"Video {video_name} is unchanged since the last run. Skipping.")
+        return "skipped"
+    entry = manifest.get(video_id) if manifest is not None else None
+    indexed_hash = entry.indexed_hash if entry is not None else None
+
+    logging.info(f"Processing video: {video_name} with ID: {video_id}")
+
+    # Skip videos the list reports as unprocessed, without fetching their index
+    if video.get("state") != "Processed":
+        logging.warning(f"Video {video_name} is not processed yet. Skipping.")
+        return "skipped"
+
+    # Check if the transcript already exists in the blob storage; if so, skip it
+    logging.info(f"Checking if transcript for {video_name} exists in blob storage.")
+
+    blob_client = context.blob_service_client.get_blob_client(
+        container=context.transcripts_container_name, blob=file_name
+    )
+    # A video recorded in the manifest is only here because it changed, so it is re-extracted even if its blob exists.
+    # In push mode an existing blob does not mean the transcript was indexed, so it is not checked
+    if entry is not None or push_mode:
+        existing_transcript = None
+    elif existing_transcripts is not None:
+        existing_transcript = existing_transcripts.get(file_name)
+    else:
+        try:
+            properties = blob_client.get_blob_properties()
+            existing_transcript = {
+                "content_encoding": properties.content_settings.content_encoding
+            }
+        except ResourceNotFoundError:
+            existing_transcript = None
+    # A blob written with the other compression setting is rewritten
+    if (
+        existing_transcript is not None
+        and existing_transcript.get("content_encoding") == context.content_encoding
+    ):
+        logging.info(f"Transcript for {video_name} already exists. Skipping.")
+        if manifest is not None:
+            manifest.record(
+                video,
+                transcript_hash="",
+                blob_name=file_name,
+                content_encoding=context.content_encoding,
+            )
+        return "skipped"
+
+    if context.source_mode == "prompt_content":
+        # Prompt content sections are already sized for embedding, with their insights
+        full_transcript = get_prompt_content_sections(context, video)
+    else:
+        # Stream the transcript fragments from the video index instead of loading the whole index
+        full_transcript = context.avi_client.iter_transcript_fragments(
+            video_id,
+            cache=context.transcript_cache,
+            version=video.get("lastModified"),
+        )
+
+        # In push mode the fragments are needed twice: for the blob and for the index documents
+        if push_mode:
+            full_transcript = list(full_transcript)
+
+    # Render the transcript straight into the upload buffer
+    buffer = io.BytesIO()
+    transcript_hash = write_transcript_blob(
+        video_name,
+        full_transcript,
+        buffer,
+        video_id=video_id,
+        transcript_format=context.transcript_format,
+        compress=context.compress_transcripts,
+        **context.transcript_format_options,
+    )
+    # The hash is of the uncompressed transcript, so a blob with another encoding is still rewritten
+    if (
+        entry is not None
+        and entry.transcript_hash == transcript_hash
+        and entry.content_encoding == context.content_encoding
+    ):
+        if not push_mode or indexed_hash == transcript_hash:
+            logging.info(f"Transcript for {video_name} is unchanged. Skipping upload.")
+            manifest.record(
+                video,
+                transcript_hash=transcript_hash,
+                blob_name=file_name,
+                indexed_hash=indexed_hash,
+                content_encoding=context.content_encoding,
+            )
+            return "skipped"
+
+        # The blob is current but the index is not, e.g. after a failed push or enabling push mode
+        logging.info(f"Transcript for {video_name} is unchanged. Pushing it to the index.")
+        push_transcript(context, video_id, video_name, full_transcript)
+        manifest.record(
+            video,
+            transcript_hash=transcript_hash,
+            blob_name=file_name,
+            indexed_hash=transcript_hash,
+            content_encoding=context.content_encoding,
+        )
+        return "processed"
+
+    buffer.seek(0)
+    blob_client.upload_blob(
+        data=buffer,
+        overwrite=True,
+        content_settings=ContentSettings(
+            content_type=TRANSCRIPT_FORMATS[context.transcript_format].content_type,
+            content_encoding=context.content_encoding,
+        ),
+    )
+    logging.info(
+        f"Uploaded transcript for {video_name} to {blob_client.blob_name} in {blob_client.container_name}."
+    )
+    if push_mode:
+        push_transcript(context, video_id, video_name, full_transcript)
+        indexed_hash = transcript_hash
+    if manifest is not None:
+        # Recorded only once pushed, so a failed push is retried by the next run
+        manifest.record(
+            video,
+            transcript_hash=transcript_hash,
+            blob_name=file_name,
+            indexed_hash=indexed_hash,
+            content_encoding=context.content_encoding,
+        )
+    return "processed"
+
+
+def get_prompt_content_sections(context: EtlContext, video: dict) -> list[dict]:
+    """
+    Gets the prompt content sections of a video, generating the prompt content if needed. Prompt
+    content is cached by video ID and last modified time, so reprocessing does not regenerate it.
+
+    :param context: ETL context, in prompt content mode
+    :param video: Video entry as returned by `list_videos_async`
+    :return: Prompt content sections, see `transcripts.prompt_content_sections`
+    :raises PromptContentNotReadyError: If the prompt content could not be retrieved in time
+    """
+    timeout_sec = float(
+        context.config.get(
+            "PromptContentTimeoutSeconds", DEFAULT_PROMPT_CONTENT_TIMEOUT_SEC
+        )
+    )
+    _, prompt_content = next(
+        context.avi_client.iter_prompt_contents(
+            [video["id"]],
+            timeout_sec=timeout_sec,
+            cache=context.prompt_content_cache,
+            versions={video["id"]: video.get("lastModified")},
+        )
+    )
+    if prompt_content is None:
+        raise PromptContentNotReadyError(
+            f"Prompt content of video ID {video['id']} was not ready within {timeout_sec} seconds."
+        )
+    return list(prompt_content_sections(prompt_content))
+
+
+def prefetch_prompt_contents(context: EtlContext, videos: list[dict]) -> set[str]:
+    """
+    Gets the prompt content of many videos at once, generating it in parallel within a single
+    deadline, so processing them serves it from the prompt content cache without waiting per video.
+
+    :param context: ETL context, in prompt content mode
+    :param videos: Video entries as returned by `list_videos_async`
+    :return: IDs of the videos whose prompt content is ready
+    """
+    timeout_sec = float(
+        context.config.get(
+            "PromptContentTimeoutSeconds", DEFAULT_PROMPT_CONTENT_TIMEOUT_SEC
+        )
+    )
+    return {
+        video_id
+        for video_id, prompt_content in context.avi_client.iter_prompt_contents(
+            [video["id"] for video in videos],
+            timeout_sec=timeout_sec,
+            cache=context.prompt_content_cache,
+            versions={video["id"]: video.get("lastModified") for video in videos},
+        )
+        if prompt_content is not None
+    }
+
+
+def push_transcript(
+    context: EtlContext, video_id: str, video_name: str, fragments: list[dict]
+) -> None:
+    """
+    Chunks a transcript, embeds the chunks (reusing cached embeddings) and uploads them to the index.
+    In prompt content mode, each section is a chunk. Chunks of a previous version of the transcript
+    beyond the new ones are deleted.
+
+    :param context: ETL context, in push mode
+    :param video_id: The video ID
+    :param video_name: The name of the video
+    :param fragments: Transcript fragments, as found under `videos[].insights.transcript`, or
+        prompt content sections in prompt content mode
+    """
+    if context.source_mode == "prompt_content":
+        documents = list(section_documents(video_name, fragments, video_id))
+    else:
+        documents = list(
+            chunk_documents(video_name, fragments, video_id, **context.chunk_options)
+        )
+    embed_documents(
+        documents,
+        context.embedder,
+        context.embedding_cache,
+        batch_size=int(
+            context.config.get("EmbeddingBatchSize", DEFAULT_EMBEDDING_BATCH_SIZE)
+        ),
+    )
+    # Chunk IDs are positional, so a shorter transcript would leave the old trailing chunks behind
+    delete_stale_documents(
+        context.search_client,
+        video_id,
+        {document["chunk_id"] for document in documents},
+    )
+    upload_documents(context.search_client, documents)
+
+
+def list_existing_transcripts(container_client: ContainerClient) -> dict[str, dict]:
+    """
+    Lists the transcripts container once so existence checks can be answered locally.
+
+    :param container_client: Container client for the transcripts container
+    :return: Mapping of blob name to its last-modified time, size and metadata
+    """
+    existing_transcripts = {
+        blob.name: {
+            "last_modified": blob.last_modified,
+            "size": blob.size,
+            "content_encoding": blob.content_settings.content_encoding,
+            "metadata": blob.metadata,
+        }
+        for blob in container_client.list_blobs(include=["metadata"])
+    }
+    logging.info(f"Found {len(existing_transcripts)} existing transcripts.")
+    return existing_transcripts
+
+
+def process_videos(
+    context: EtlContext,
+    videos: Iterable[dict],
+    manifest: Optional[TranscriptManifest] = None,
+    existing_transcripts: Optional[dict[str, dict]] = None,
+    defer: Optional[Callable[[str], None]] = None,
+) -> dict[str, int]:
+    """
+    Processes videos concurrently; a failure in one video does not abort the batch.
+
+    :param context: ETL context
+    :param videos: Video entries as returned by `iter_videos`. Consumed lazily, so processing starts
+        while later pages are still loading
+    :param manifest: Manifest of previous runs, see `process_video`
+    :param existing_transcripts: Transcript blobs listed at the start of the run, see `process_video`
+    :param defer: Called with the ID of each video whose prompt content is not ready yet, e.g. to
+        enqueue it again with a delay. If not provided, such videos count as failed
+    :return: Number of processed, skipped, deferred and failed videos
+    """
+    summary = {"processed": 0, "skipped": 0, "deferred": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=context.max_workers) as executor:
+        futures = {
+            executor.submit(
+                process_video, context, video, manifest, existing_transcripts
+            ): video
+            for video in videos
+        }
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                summary[future.result()] += 1
+            except PromptContentNotReadyError as e:
+                if defer is None:
+                    summary["failed"] += 1
+                    logging.warning(str(e))
+                    continue
+                defer(video["id"])
+                summary["deferred"] += 1
+                logging.info(f"{e} Deferred.")
+            except Exception:
+                summary["failed"] += 1
+                logging.exception(
+                    f"Failed to process video {video['name']} with ID: {video['id']}."
+                )
+
+    if manifest is not None:
+        manifest.save()
+
+    logging.info(
+        f"Processed {summary['processed']}, skipped {summary['skipped']}, deferred {summary['deferred']} "
+        + f"and failed {summary['failed']} of {len(futures)} videos using {context.max_workers} workers."
+    )
+    return summary
+
+
+def run_full_sweep(
+    context: EtlContext, defer: Optional[Callable[[str], None]] = None
+) -> dict[str, int]:
+    """
+    Extracts the transcripts of all videos in the account that do not have one yet.
+
+    :param context: ETL context
+    :param defer: Called with the ID of each video whose prompt content is not ready yet, see
+        `process_videos`
+    :return: Number of processed, skipped, deferred and failed videos
+    """
+    # In incremental mode, only touch videos that are new, changed or previously unprocessed
+    manifest = context.load_manifest()
+
+    # List existing transcripts once instead of checking each video's blob individually
+    existing_transcripts = list_existing_transcripts(
+        context.blob_service_client.get_container_client(
+            context.transcripts_container_name
+        )
+    )
+
+    # List videos page by page; videos are dispatched to workers while later pages load
+    video_list = context.avi_client.iter_videos(
+        page_size=int(context.config.get("AVIListPageSize", DEFAULT_LIST_PAGE_SIZE))
+    )
+
+    return process_videos(context, video_list, manifest, existing_transcripts, defer)
+
+
+def process_video_by_id(context: EtlContext, video_id: str) -> str:
+    """
+    Extracts the transcript of a single video, e.g. when notified that it finished indexing.
+    Safe to repeat: an already extracted, unchanged video is skipped.
+
+    :param context: ETL context
+    :param video_id: The video ID
+    :return: "processed" if a transcript was uploaded, otherwise "skipped"
+    """
+    video = context.avi_client.get_video_entry(video_id)
+    if video is None:
+        logging.warning(f"Video {video_id} was not found. Skipping.")
+        return "skipped"
+
+    manifest = context.load_manifest(preload=False)
+    result = process_video(context, video, manifest)
+    if manifest is not None:
+        manifest.save()
+    return result
+
+
+def enumerate_video_batches(context: EtlContext) -> list[list[dict]]:
+    """
+    Pages through the videos in the account and groups those that may need their transcript extracted
+    into batches, for workers to process independently. Videos the list reports as unprocessed,
+    videos whose transcript already exists (outside push mode) and, in incremental mode, videos
+    unchanged since the last run are left out without any further call.
+
+    :param context: ETL context
+    :return: Batches of video entries, reduced to the fields `process_video` needs
+    """
+    manifest = context.load_manifest()
+    batch_size = int(context.config.get("ETLBatchSize", DEFAULT_BATCH_SIZE))
+    push_mode = context.search_client is not None
+
+    # List existing transcripts once, so workers need no per-video existence check
+    existing_transcripts = (
+        list_existing_transcripts(
+            context.blob_service_client.get_container_client(
+                context.transcripts_container_name
+            )
+        )
+        if not push_mode
+        else {}
+    )
+
+    batches = [[]]
+    for video in context.avi_client.iter_videos(
+        page_size=int(context.config.get("AVIListPageSize", DEFAULT_LIST_PAGE_SIZE))
+    ):
+        if video.get("state") != "Processed":
+            continue
+        file_name = context.transcript_blob_name(video["name"])
+        if manifest is not None and not manifest.needs_processing(
+            video,
+            file_name,
+            require_indexed=push_mode,
+            content_encoding=context.content_encoding,
+        ):
+            continue
+        entry = manifest.get(video["id"]) if manifest is not None else None
+        existing_transcript = existing_transcripts.get(file_name)
+        if (
+            entry is None
+            and existing_transcript is not None
+            and existing_transcript["content_encoding"] == context.content_encoding
+        ):
+            if manifest is not None:
+                manifest.record(
+                    video,
+                    transcript_hash="",
+                    blob_name=file_name,
+                    content_encoding=context.content_encoding,
+                )
+            continue
+
+        if len(batches[-1]) == batch_size:
+            batches.append([])
+        batches[-1].append(
+            {
+                key: video.get(key)
+                for key in ("id", "name", "state", "lastModified")
+            }
+        )
+
+    if manifest is not None:
+        manifest.save()
+    return batches if batches[0] else []
+
+
+def process_video_batch(
+    context: EtlContext,
+    videos: list[dict],
+    defer: Optional[Callable[[str], None]] = None,
+) -> dict[str, int]:
+    """
+    Processes a batch of videos enqueued by `enumerate_video_batches`.
+    Safe to repeat: videos already extracted and unchanged are skipped.
+
+    :param context: ETL context
+    :param videos: Video entries of the batch
+    :param defer: Called with the ID of each video whose prompt content is not ready yet, see
+        `process_videos`
+    :return: Number of processed, skipped, deferred and failed videos
+    """
+    # Rather than have each worker wait for its own video, the batch waits once for all its prompt
+    # content; videos still without one are deferred without blocking a worker
+    not_ready = []
+    if context.source_mode == "prompt_content":
+        ready = prefetch_prompt_contents(context, videos)
+        not_ready = [video for video in videos if video["id"] not in ready]
+        videos = [video for video in videos if video["id"] in ready]
+        if not_ready:
+            logging.warning(
+                f"Prompt content of {len(not_ready)} videos is not ready yet: "
+                + ", ".join(video["id"] for video in not_ready)
+            )
+
+    # Only the batch's manifest entries are read, and videos with an existing transcript were
+    # already left out when the batch was enumerated
+    summary = process_videos(
+        context,
+        videos,
+        context.load_manifest(preload=False),
+        existing_transcripts={},
+        defer=defer,
+    )
+    for video in not_ready:
+        if defer is None:
+            summary["failed"] += 1
+        else:
+            defer(video["id"])
+            summary["deferred"] += 1
+    return summary
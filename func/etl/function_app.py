@@ -1,109 +1,198 @@
-from datetime import datetime
-import logging
-import os
-import sys
-
-dir_path = os.path.dirname(os.path.realpath(__file__))
-sys.path.insert(0, dir_path)
-
-from azure.appconfiguration.provider import load
-from azure.identity import DefaultAzureCredential
-from azure.storage.blob import BlobServiceClient
-import azure.functions as func
-import pandas as pd
-
-from avi_helpers import Consts, VideoIndexerClient
-
-
-app = func.FunctionApp()
-
-
-@app.function_name(name="save_full_transcripts")
-@app.timer_trigger(schedule="0 0 0 * * *", arg_name="timer", run_on_startup=True)
-def save_full_transcripts(timer: func.TimerRequest) -> func.HttpResponse:
-    logging.info(f"`save_full_transcript` function started at {datetime.now()}.")
-    credential = DefaultAzureCredential()
-
-    # Load configuration from Azure App Configuration
-    endpoint = os.environ.get("AZURE_APPCONFIG_ENDPOINT")
-    logging.info("Loading configuration from Azure App Configuration.")
-    logging.debug(f"Endpoint: {endpoint}")
-
-    config = load(endpoint=endpoint, credential=credential)
-    logging.info("Configuration loaded successfully.")
-    logging.debug(f"Configuration: {config}")
-
-    # Create Video Indexer Client & authenticate
-    consts = Consts(
-        config["AVIResourceName"],
-        config["AVIResourceGroup"],
-        config["AVISubscriptionID"],
-    )
-    avi_client = VideoIndexerClient()
-    avi_client.authenticate_async(consts)
-    logging.info("Authenticated with Video Indexer successfully.")
-
-    # Create Blob Service & Container Clients
-    blob_service_client = BlobServiceClient(
-        config["TranscriptsStorageURL"], credential=credential
-    )
-    logging.info("Blob service client created successfully.")
-
-    # Get the list of videos
-    video_list = avi_client.list_videos_async()
-    logging.info("Fetched video list successfully.")
-
-    for video in video_list:
-        # Get video details
-        video_name = video["name"]
-        video_id = video["id"]
-        logging.info(f"Processing video: {video_name} with ID: {video_id}")
-
-        # Check if the video is processed; if not, skip it
-        if not avi_client.is_video_processed(video_id):
-            logging.warning(f"Video {video_name} is not processed yet. Skipping.")
-            continue
-
-        # Check if the transcript already exists in the blob storage; if so, skip it
-        file_name = f"{video_name}.txt"
-        logging.info(f"Checking if transcript for {video_name} exists in blob storage.")
-
-        blob_client = blob_service_client.get_blob_client(
-            container=config["TranscriptsStorageContainerName"], blob=file_name
-        )
-        if blob_client.exists():
-            logging.info(f"Transcript for {video_name} already exists. Skipping.")
-            continue
-
-        # Get full transcript from video
-        video = avi_client.get_video_async(video_id)
-        insights = video["videos"][0]["insights"]
-        full_transcript = insights.get("transcript")
-
-        # Format transcript
-        transcript_elements = []
-        for fragment in full_transcript:
-            fragment_dict = {
-                "text": fragment["text"],
-                "start": fragment["instances"][0]["start"],
-                "end": fragment["instances"][0]["end"],
-            }
-            transcript_elements.append(fragment_dict)
-
-        transcript_df = pd.DataFrame(transcript_elements)
-        file_text = f"Video Name: {video_name}\n"
-        transcript_df["line"] = (
-            transcript_df["start"]
-            + " - "
-            + transcript_df["end"]
-            + ": "
-            + transcript_df["text"]
-        )
-        file_text += "\n".join(transcript_df["line"].tolist())
-
-        blob_client.upload_blob(data=file_text, overwrite=True)
-        logging.info(
-            f"Uploaded transcript for {video_name} to {blob_client.blob_name} in {blob_client.container_name}."
-        )
-
-    logging.info(f"`save_full_transcript` function completed at {datetime.now()}.")
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import sys
+import uuid
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, dir_path)
+
+import azure.functions as func
+from azure.storage.queue import QueueClient
+
+from etl import (
+    DEFAULT_PROMPT_CONTENT_MAX_ATTEMPTS,
+    PromptContentNotReadyError,
+    enumerate_video_batches,
+    get_etl_context,
+    process_video_batch,
+    process_video_by_id,
+    prompt_content_retry_delay,
+    run_full_sweep,
+)
+from rag import get_rag_service
+from runs import get_run_tally, record_batch, start_run
+
+
+app = func.FunctionApp()
+
+# Queue of videos whose transcript should be extracted, one message per video:
+# {"video_id": "<id>", "attempt": <times deferred, optional>}. Messages are plain JSON (see
+# `messageEncoding` in host.json).
+TRANSCRIPTS_QUEUE_NAME = "transcripts-to-extract"
+
+# Queue of video batches enqueued by the reconciliation sweep:
+# {"run_id": "<id>", "batch_index": <n>, "videos": [{"id": ..., "name": ..., ...}, ...]}
+BATCHES_QUEUE_NAME = "transcript-batches"
+
+
+def defer_video(video_id: str, attempt: int = 1) -> None:
+    """
+    Enqueues a video whose prompt content is not ready yet, to be extracted again after a delay.
+    Output bindings cannot delay messages, so the message is sent with the queue client.
+
+    :param video_id: The video ID
+    :param attempt: Number of times the video was deferred, including this one
+    """
+    queue_client = QueueClient.from_connection_string(
+        os.environ["AzureWebJobsStorage"], TRANSCRIPTS_QUEUE_NAME
+    )
+    with queue_client:
+        queue_client.send_message(
+            json.dumps({"video_id": video_id, "attempt": attempt}),
+            visibility_timeout=prompt_content_retry_delay(attempt),
+        )
+
+
+@app.function_name(name="save_full_transcripts")
+@app.timer_trigger(schedule="0 0 0 * * 0", arg_name="timer", run_on_startup=False)
+@app.queue_output(
+    arg_name="msgs", queue_name=BATCHES_QUEUE_NAME, connection="AzureWebJobsStorage"
+)
+def save_full_transcripts(timer: func.TimerRequest, msgs: func.Out[list[str]]) -> None:
+    # Low-frequency reconciliation; new videos are normally picked up by `extract_transcript`
+    logging.info(f"`save_full_transcript` function started at {datetime.now()}.")
+    context = get_etl_context()
+
+    if str(context.config.get("ETLFanOut", "true")).lower() != "true":
+        run_full_sweep(context, defer=defer_video)
+        logging.info(f"`save_full_transcript` function completed at {datetime.now()}.")
+        return
+
+    # Fan out: enqueue batches of videos for `extract_transcript_batch` to process in parallel
+    run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    batches = enumerate_video_batches(context)
+    video_count = sum(len(batch) for batch in batches)
+    start_run(context.get_state_container_client(), run_id, len(batches), video_count)
+    msgs.set(
+        [
+            json.dumps({"run_id": run_id, "batch_index": i, "videos": batch})
+            for i, batch in enumerate(batches)
+        ]
+    )
+
+    logging.info(
+        f"`save_full_transcript` function enqueued {video_count} videos in {len(batches)} batches "
+        + f"for run {run_id} at {datetime.now()}."
+    )
+
+
+@app.function_name(name="extract_transcript")
+@app.queue_trigger(
+    arg_name="msg", queue_name=TRANSCRIPTS_QUEUE_NAME, connection="AzureWebJobsStorage"
+)
+def extract_transcript(msg: func.QueueMessage) -> None:
+    body = json.loads(msg.get_body())
+    video_id = body["video_id"]
+    logging.info(f"`extract_transcript` function started for video ID: {video_id}.")
+    context = get_etl_context()
+
+    # Failures propagate so the message is retried and eventually moved to the poison queue.
+    # Prompt content that is not ready yet is not a failure: the video is enqueued again for later
+    try:
+        result = process_video_by_id(context, video_id)
+    except PromptContentNotReadyError:
+        attempt = body.get("attempt", 0) + 1
+        max_attempts = int(
+            context.config.get(
+                "PromptContentMaxAttempts", DEFAULT_PROMPT_CONTENT_MAX_ATTEMPTS
+            )
+        )
+        if attempt > max_attempts:
+            raise
+        defer_video(video_id, attempt)
+        result = "deferred"
+
+    logging.info(f"`extract_transcript` function {result} video ID: {video_id}.")
+
+
+@app.function_name(name="video_indexer_callback")
+@app.route(route="callback", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+@app.queue_output(
+    arg_name="msg", queue_name=TRANSCRIPTS_QUEUE_NAME, connection="AzureWebJobsStorage"
+)
+def video_indexer_callback(
+    req: func.HttpRequest, msg: func.Out[str]
+) -> func.HttpResponse:
+    # Video Indexer calls the callback URL given at upload with `?id=<video ID>&state=<state>`
+    video_id = req.params.get("id")
+    state = req.params.get("state")
+    if not video_id:
+        return func.HttpResponse("Missing video ID.", status_code=400)
+
+    logging.info(f"Video Indexer reported state {state} for video ID: {video_id}.")
+    if state == "Processed":
+        msg.set(json.dumps({"video_id": video_id}))
+
+    return func.HttpResponse(status_code=200)
+
+
+@app.function_name(name="extract_transcript_batch")
+@app.queue_trigger(
+    arg_name="msg", queue_name=BATCHES_QUEUE_NAME, connection="AzureWebJobsStorage"
+)
+def extract_transcript_batch(msg: func.QueueMessage) -> None:
+    batch = json.loads(msg.get_body())
+    logging.info(
+        f"`extract_transcript_batch` function started for batch {batch['batch_index']} of run {batch['run_id']}."
+    )
+    context = get_etl_context()
+
+    summary = process_video_batch(context, batch["videos"], defer=defer_video)
+    record_batch(
+        context.get_state_container_client(),
+        batch["run_id"],
+        batch["batch_index"],
+        summary,
+    )
+
+
+@app.function_name(name="get_run")
+@app.route(route="runs/{run_id}", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def get_run(req: func.HttpRequest) -> func.HttpResponse:
+    tally = get_run_tally(
+        get_etl_context().get_state_container_client(), req.route_params["run_id"]
+    )
+    if tally is None:
+        return func.HttpResponse("Run not found.", status_code=404)
+    return func.HttpResponse(json.dumps(tally), mimetype="application/json")
+
+
+@app.function_name(name="ask")
+@app.route(route="ask", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+def ask(req: func.HttpRequest) -> func.HttpResponse:
+    # {"question": "...", "video_id": "<optional, to only search one video>"}
+    try:
+        body = req.get_json()
+    except ValueError:
+        return func.HttpResponse("Invalid JSON body.", status_code=400)
+    if not isinstance(body, dict):
+        return func.HttpResponse("Expected a JSON object.", status_code=400)
+    question = body.get("question")
+    if not question:
+        return func.HttpResponse("Missing question.", status_code=400)
+    if not isinstance(question, str):
+        return func.HttpResponse("The question must be a string.", status_code=400)
+
+    video_filter = None
+    video_id = body.get("video_id")
+    if video_id:
+        if not isinstance(video_id, str):
+            return func.HttpResponse("The video_id must be a string.", status_code=400)
+        escaped_id = video_id.replace("'", "''")
+        video_filter = f"parent_id eq '{escaped_id}'"
+
+    # The answer is generated as a stream, but returned whole: HTTP responses are not streamed
+    result = get_rag_service().answer(question, video_filter)
+    return func.HttpResponse(json.dumps(result), mimetype="application/json")
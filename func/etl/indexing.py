@@ -0,0 +1,214 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable
+import json
+import logging
+import random
+import threading
+import time
+
+from azure.search.documents import RequestEntityTooLargeError, SearchClient
+
+
+# Azure AI Search accepts at most 1000 documents and 16 MB per indexing request
+MAX_BATCH_DOCUMENTS = 1000
+MAX_BATCH_BYTES = 15 * 1024 * 1024
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_RETRIES = 4
+
+# Per-document statuses worth retrying: version conflict, concurrent update, service busy
+RETRY_STATUS_CODES = frozenset({409, 422, 503})
+
+
+class BulkIndexer:
+    """
+    Buffers documents and pushes them to the search index in batches, in the spirit of the SDK's
+    `SearchIndexingBufferedSender`:
+
+    - batches are sized to the request limits, by document count and by serialized payload size,
+      and a batch the service still rejects as too large is split in half and resent;
+    - full batches are sent in parallel on a thread pool while more documents are buffered;
+    - documents that fail with a transient status are retried with exponential backoff, while the
+      rest of their batch is not resent.
+
+    Use as a context manager, or call `flush` to send the remaining documents and wait for all batches.
+    """
+
+    def __init__(
+        self,
+        search_client: SearchClient,
+        max_batch_documents: int = MAX_BATCH_DOCUMENTS,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        key_field: str = "chunk_id",
+    ) -> None:
+        self.search_client = search_client
+        self.key_field = key_field
+        self.max_batch_documents = max_batch_documents
+        self.max_batch_bytes = max_batch_bytes
+        self.max_retries = max_retries
+        self.uploaded = 0
+        self.failed: list[str] = []
+        self._batch: list[dict] = []
+        self._batch_bytes = 0
+        self._futures: list[Future] = []
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="indexer"
+        )
+        self._lock = threading.Lock()
+
+    def add(self, documents: Iterable[dict]) -> None:
+        """
+        Buffers documents, sending each batch as soon as it is full
+
+        :param documents: Documents to merge into the index, keyed by the index key field
+        """
+        for document in documents:
+            size = len(json.dumps(document, ensure_ascii=False).encode("utf-8"))
+            if self._batch and (
+                len(self._batch) >= self.max_batch_documents
+                or self._batch_bytes + size > self.max_batch_bytes
+            ):
+                self._submit()
+            self._batch.append(document)
+            self._batch_bytes += size
+
+    def flush(self) -> int:
+        """
+        Sends the buffered documents and waits for all batches to complete
+
+        :return: Number of documents uploaded so far
+        :raises RuntimeError: If any document could not be uploaded
+        """
+        if self._batch:
+            self._submit()
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+        if self.failed:
+            raise RuntimeError(
+                f"Failed to upload {len(self.failed)} documents: {self.failed[:10]}"
+            )
+        return self.uploaded
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "BulkIndexer":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            self.close()
+
+    def _submit(self) -> None:
+        batch, self._batch, self._batch_bytes = self._batch, [], 0
+        self._futures.append(self._executor.submit(self._send, batch))
+
+    def _send(self, batch: list[dict], attempt: int = 1) -> None:
+        try:
+            results = self.search_client.merge_or_upload_documents(batch)
+        except RequestEntityTooLargeError:
+            if len(batch) == 1:
+                raise
+            middle = len(batch) // 2
+            logging.info(f"Batch of {len(batch)} documents too large. Splitting.")
+            self._send(batch[:middle], attempt)
+            self._send(batch[middle:], attempt)
+            return
+
+        # Results are matched to documents by key, as the service does not promise to keep their order
+        documents_by_key = {document[self.key_field]: document for document in batch}
+        retry, failed = [], []
+        for result in results:
+            if result.succeeded:
+                continue
+            if result.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                retry.append(documents_by_key[result.key])
+            else:
+                failed.append(result.key)
+                logging.error(
+                    f"Failed to upload document {result.key}: {result.status_code} {result.error_message}"
+                )
+
+        with self._lock:
+            self.uploaded += len(batch) - len(retry) - len(failed)
+            self.failed.extend(failed)
+
+        if retry:
+            delay = random.uniform(0, 2**attempt)
+            logging.warning(
+                f"Retrying {len(retry)} documents in {delay:.1f} seconds (attempt {attempt})."
+            )
+            time.sleep(delay)
+            self._send(retry, attempt + 1)
+
+
+def upload_documents(
+    search_client: SearchClient,
+    documents: Iterable[dict],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> int:
+    """
+    Pushes documents to the search index, merging them into existing documents with the same key.
+
+    :param search_client: Search client for the target index
+    :param documents: Documents to upload
+    :param max_workers: Number of batches sent in parallel
+    :return: Number of documents uploaded
+    :raises RuntimeError: If any document failed to upload
+    """
+    with BulkIndexer(search_client, max_workers=max_workers) as indexer:
+        indexer.add(documents)
+    logging.info(f"Uploaded {indexer.uploaded} documents to the search index.")
+    return indexer.uploaded
+
+
+def delete_stale_documents(
+    search_client: SearchClient,
+    parent_id: str,
+    keep_keys: set[str],
+    key_field: str = "chunk_id",
+    parent_field: str = "parent_id",
+) -> int:
+    """
+    Deletes the documents of a parent that are not in its latest upload, e.g. the trailing chunks
+    of a transcript that now splits into fewer chunks.
+
+    :param search_client: Search client for the target index
+    :param parent_id: The parent's ID, e.g. the video ID
+    :param keep_keys: Keys of the parent's current documents
+    :param key_field: Name of the index key field
+    :param parent_field: Name of the field holding the parent's ID
+    :return: Number of documents deleted
+    :raises RuntimeError: If any document could not be deleted
+    """
+    escaped_id = parent_id.replace("'", "''")
+    stale_keys = [
+        result[key_field]
+        for result in search_client.search(
+            search_text="*",
+            filter=f"{parent_field} eq '{escaped_id}'",
+            select=[key_field],
+        )
+        if result[key_field] not in keep_keys
+    ]
+
+    failed = []
+    for i in range(0, len(stale_keys), MAX_BATCH_DOCUMENTS):
+        results = search_client.delete_documents(
+            [{key_field: key} for key in stale_keys[i : i + MAX_BATCH_DOCUMENTS]]
+        )
+        failed.extend(result.key for result in results if not result.succeeded)
+
+    if failed:
+        raise RuntimeError(f"Failed to delete {len(failed)} documents: {failed[:10]}")
+    if stale_keys:
+        logging.info(
+            f"Deleted {len(stale_keys)} stale documents of {parent_id} from the search index."
+        )
+    return len(stale_keys)
@@ -0,0 +1,257 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Optional
+import json
+import logging
+import threading
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContainerClient, ContentSettings
+
+
+DEFAULT_MANIFEST_PREFIX = "manifest/"
+# Rewritten when saved entries change a transcript's content, so readers can tell from its ETag
+INDEX_VERSION_BLOB_NAME = "index-version"
+ENTRY_METADATA_KEY = "entry"
+DEFAULT_SAVE_WORKERS = 8
+
+
+@dataclass
+class ManifestEntry:
+    video_id: str
+    video_name: str
+    last_modified: Optional[str]
+    state: Optional[str]
+    transcript_hash: str
+    blob_name: str
+    updated_at: str
+    # Hash of the transcript last pushed to the search index, in push mode
+    indexed_hash: Optional[str] = None
+    # Content-Encoding of the transcript blob, e.g. "gzip"
+    content_encoding: Optional[str] = None
+
+
+class TranscriptManifest:
+    """
+    Persisted checkpoint of the transcripts extracted by the ETL, stored as one small blob per video.
+
+    Each entry records the video's last-modified time and index state as listed by Video Indexer
+    together with a hash of the uploaded transcript, so a run only needs to touch videos that are
+    new, changed or were not processed the last time they were seen.
+    Entries are also kept in their blob's metadata, so `load` reads the whole manifest from the
+    listing of the prefix (5000 entries per request) without downloading any blob. Workers only
+    write the entries of the videos they processed, so concurrent runs never contend for a blob.
+    """
+
+    def __init__(
+        self, container_client: ContainerClient, prefix: str = DEFAULT_MANIFEST_PREFIX
+    ) -> None:
+        """
+        A manifest created directly reads each entry on first use, one blob per video, which suits
+        runs touching a few videos. Use `load` to read all entries at once.
+
+        :param container_client: Container client for the ETL state container
+        :param prefix: Prefix of the entry blobs
+        """
+        self.container_client = container_client
+        self.prefix = prefix
+        self.entries: dict[str, Optional[ManifestEntry]] = {}
+        self._loaded = False
+        self._dirty: set[str] = set()
+        # Dirty entries whose transcript content changed, which bump the index version when saved
+        self._changed: set[str] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(
+        cls,
+        container_client: ContainerClient,
+        prefix: str = DEFAULT_MANIFEST_PREFIX,
+        legacy_blob_name: Optional[str] = None,
+    ) -> "TranscriptManifest":
+        """
+        Load all entries of the manifest from the listing of its prefix
+
+        :param container_client: Container client for the ETL state container
+        :param prefix: Prefix of the entry blobs
+        :param legacy_blob_name: Name of a single-blob manifest written by earlier versions. If it
+            exists, its entries are imported and it is deleted
+        :return: The loaded manifest
+        """
+        manifest = cls(container_client, prefix)
+        for blob in container_client.list_blobs(
+            name_starts_with=prefix, include=["metadata"]
+        ):
+            value = (blob.metadata or {}).get(ENTRY_METADATA_KEY)
+            if value is not None:
+                entry = ManifestEntry(**json.loads(value))
+                manifest.entries[entry.video_id] = entry
+        manifest._loaded = True
+
+        if legacy_blob_name is not None:
+            manifest._import_legacy(legacy_blob_name)
+
+        logging.info(
+            f"Loaded transcript manifest with {len(manifest.entries)} entries from {prefix}."
+        )
+        return manifest
+
+    def _import_legacy(self, blob_name: str) -> None:
+        blob_client = self.container_client.get_blob_client(blob_name)
+        try:
+            data = json.loads(blob_client.download_blob().readall())
+        except ResourceNotFoundError:
+            return
+
+        for video_id, entry in data.get("videos", {}).items():
+            if video_id not in self.entries:
+                self.entries[video_id] = ManifestEntry(**entry)
+                self._dirty.add(video_id)
+        logging.info(f"Importing {len(self._dirty)} entries from {blob_name}.")
+        self.save()
+        try:
+            blob_client.delete_blob()
+        except ResourceNotFoundError:
+            pass
+
+    def _blob_name(self, video_id: str) -> str:
+        return f"{self.prefix}{video_id}.json"
+
+    def _download(self, video_id: str) -> Optional[ManifestEntry]:
+        try:
+            data = self.container_client.download_blob(self._blob_name(video_id)).readall()
+        except ResourceNotFoundError:
+            return None
+        return ManifestEntry(**json.loads(data))
+
+    def needs_processing(
+        self,
+        video: dict,
+        blob_name: Optional[str] = None,
+        require_indexed: bool = False,
+        content_encoding: Optional[str] = None,
+    ) -> bool:
+        """
+        Check whether a listed video is new, changed or previously unprocessed
+
+        :param video: Video entry as returned by the list videos API
+        :param blob_name: Expected transcript blob name. If it differs from the recorded one
+            (e.g. after changing the transcript format), the video is processed again
+        :param require_indexed: In push mode, also process videos whose recorded transcript was
+            not pushed to the search index, e.g. after a failed push or enabling push mode
+        :param content_encoding: Expected Content-Encoding of the transcript blob. If it differs from
+            the recorded one (after turning compression on or off), the blob is written again
+        :return: True if the video should be processed in this run
+        """
+        entry = self.get(video["id"])
+        return (
+            entry is None
+            or entry.state != "Processed"
+            or entry.last_modified != video.get("lastModified")
+            or (blob_name is not None and entry.blob_name != blob_name)
+            or (require_indexed and entry.indexed_hash != entry.transcript_hash)
+            or entry.content_encoding != content_encoding
+        )
+
+    def get(self, video_id: str) -> Optional[ManifestEntry]:
+        with self._lock:
+            if self._loaded or video_id in self.entries:
+                return self.entries.get(video_id)
+
+        entry = self._download(video_id)
+        with self._lock:
+            return self.entries.setdefault(video_id, entry)
+
+    def record(
+        self,
+        video: dict,
+        transcript_hash: str,
+        blob_name: str,
+        indexed_hash: Optional[str] = None,
+        content_encoding: Optional[str] = None,
+    ) -> None:
+        """
+        Record a successfully extracted transcript; persisted by the next `save`
+
+        :param video: Video entry as returned by the list videos API
+        :param transcript_hash: Hash of the uploaded transcript
+        :param blob_name: Name of the transcript blob
+        :param indexed_hash: Hash of the transcript pushed to the search index, if any
+        :param content_encoding: Content-Encoding of the transcript blob, if any
+        """
+        entry = ManifestEntry(
+            video_id=video["id"],
+            video_name=video["name"],
+            last_modified=video.get("lastModified"),
+            state=video.get("state", "Processed"),
+            transcript_hash=transcript_hash,
+            blob_name=blob_name,
+            updated_at=datetime.now(timezone.utc).isoformat(),
+            indexed_hash=indexed_hash,
+            content_encoding=content_encoding,
+        )
+        with self._lock:
+            previous = self.entries.get(entry.video_id)
+            # An entry recorded for an existing blob ("" hash) or re-recorded unchanged leaves the
+            # content alone; in push mode, the content changes once the documents are uploaded
+            if (
+                transcript_hash
+                and (previous is None or previous.transcript_hash != transcript_hash)
+            ) or (
+                indexed_hash is not None
+                and (previous is None or previous.indexed_hash != indexed_hash)
+            ):
+                self._changed.add(entry.video_id)
+            self.entries[entry.video_id] = entry
+            self._dirty.add(entry.video_id)
+
+    def save(self) -> None:
+        """
+        Persist the entries recorded since the last save. An entry that fails to save is logged and
+        kept for the next save; until then, its video is only processed again.
+        """
+        with self._lock:
+            dirty = [self.entries[video_id] for video_id in self._dirty]
+            changed = set(self._changed)
+            self._dirty.clear()
+            self._changed.clear()
+        if not dirty:
+            return
+
+        def save_entry(entry: ManifestEntry) -> bool:
+            # Metadata values must be ASCII, which `json.dumps` ensures by default
+            body = json.dumps(asdict(entry))
+            try:
+                self.container_client.upload_blob(
+                    self._blob_name(entry.video_id),
+                    body,
+                    overwrite=True,
+                    metadata={ENTRY_METADATA_KEY: body},
+                    content_settings=ContentSettings(content_type="application/json"),
+                )
+            except Exception:
+                logging.exception(
+                    f"Failed to save the manifest entry of video ID {entry.video_id}."
+                )
+                with self._lock:
+                    self._dirty.add(entry.video_id)
+                    if entry.video_id in changed:
+                        self._changed.add(entry.video_id)
+                return False
+            return True
+
+        with ThreadPoolExecutor(max_workers=DEFAULT_SAVE_WORKERS) as executor:
+            results = list(executor.map(save_entry, dirty))
+        saved = sum(results)
+
+        if any(ok and entry.video_id in changed for ok, entry in zip(results, dirty)):
+            try:
+                self.container_client.upload_blob(
+                    INDEX_VERSION_BLOB_NAME,
+                    json.dumps({"updated_at": datetime.now(timezone.utc).isoformat()}),
+                    overwrite=True,
+                )
+            except Exception:
+                logging.exception("Failed to update the index version.")
+        logging.info(f"Saved {saved} of {len(dirty)} transcript manifest entries.")
@@ -0,0 +1,420 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterator, Mapping, Optional, Protocol
+import json
+import logging
+import threading
+import time
+
+from azure.core.credentials import TokenCredential
+from azure.core.exceptions import ResourceNotFoundError
+from azure.identity import DefaultAzureCredential
+from azure.search.documents import SearchClient
+from azure.storage.blob import BlobClient, BlobServiceClient
+import requests
+
+from embeddings import COGNITIVE_SERVICES_SCOPE
+from etl import (
+    DEFAULT_INDEX_NAME,
+    DEFAULT_STATE_CONTAINER_NAME,
+    create_embedder,
+    load_configuration,
+)
+from manifest import INDEX_VERSION_BLOB_NAME
+from request_policy import RequestPolicy
+from retrieval import (
+    DEFAULT_SELECT,
+    DEFAULT_TOP,
+    TIME_FIELDS,
+    HybridRetriever,
+    normalize_query,
+)
+
+
+DEFAULT_CHAT_MODEL = "gpt-4o-mini"
+CHAT_API_VERSION = "2024-06-01"
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL_SEC = 3600
+DEFAULT_INDEX_VERSION_TTL_SEC = 60
+
+SYSTEM_PROMPT = (
+    "You answer questions about recorded videos using only the numbered transcript excerpts "
+    + "provided. Cite the excerpts you use by their number in square brackets, e.g. [1]. "
+    + "If the excerpts do not contain the answer, say that you don't know."
+)
+
+
+class Retriever(Protocol):
+    def retrieve(
+        self, query: str, top: int = DEFAULT_TOP, filter: Optional[str] = None
+    ) -> list[dict]: ...
+
+
+class ChatModel(Protocol):
+    def stream(self, messages: list[dict]) -> Iterator[str]: ...
+
+
+class AzureOpenAIChatModel:
+    """
+    Generates answers with an Azure OpenAI chat deployment, streamed as server-sent events.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        credential: TokenCredential,
+        deployment: str = DEFAULT_CHAT_MODEL,
+        temperature: float = 0.0,
+        session: Optional[requests.Session] = None,
+        request_policy: Optional[RequestPolicy] = None,
+    ) -> None:
+        """
+        :param endpoint: Azure OpenAI resource URL, e.g. https://<name>.openai.azure.com
+        :param credential: Credential with access to the Azure OpenAI resource
+        :param deployment: Name of the chat deployment
+        :param temperature: Sampling temperature
+        :param session: Session to send the requests with
+        :param request_policy: Policy to rate limit and retry the requests with
+        """
+        self.url = (
+            f"{endpoint.rstrip('/')}/openai/deployments/{deployment}/chat/completions"
+            + f"?api-version={CHAT_API_VERSION}"
+        )
+        self.credential = credential
+        self.temperature = temperature
+        self.session = session if session is not None else requests.Session()
+        self.request_policy = (
+            request_policy if request_policy is not None else RequestPolicy()
+        )
+
+    def stream(self, messages: list[dict]) -> Iterator[str]:
+        """
+        :param messages: Chat messages
+        :return: Generator of the answer's tokens as they are generated
+        """
+        headers = {
+            "Authorization": "Bearer "
+            + self.credential.get_token(COGNITIVE_SERVICES_SCOPE).token,
+            "Content-Type": "application/json",
+        }
+        response = self.request_policy.send(
+            self.session.request,
+            "POST",
+            self.url,
+            headers=headers,
+            json={
+                "messages": messages,
+                "temperature": self.temperature,
+                "stream": True,
+            },
+            stream=True,
+        )
+        response.raise_for_status()
+
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:") :].strip()
+                if data == "[DONE]":
+                    break
+                # The first event only carries content filter results
+                for choice in json.loads(data).get("choices", []):
+                    content = choice.get("delta", {}).get("content")
+                    if content:
+                        yield content
+
+
+class ExtractiveChatModel:
+    """
+    Local stand-in for a chat model: answers with the first excerpt of the prompt, word by word.
+    Enough to exercise retrieval, prompting, streaming and caching without calling Azure OpenAI.
+    """
+
+    def stream(self, messages: list[dict]) -> Iterator[str]:
+        excerpts = messages[-1]["content"].split("\n\n")[1:-1]
+        if not excerpts:
+            yield "I don't know."
+            return
+        number, _, text = excerpts[0].partition("] ")
+        words = text.split(": ", 1)[-1].split()
+        for i, word in enumerate(words):
+            yield word if i == 0 else " " + word
+        yield f" {number}]"
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory LRU cache whose entries also expire after a time to live.
+    """
+
+    def __init__(
+        self, maxsize: int = DEFAULT_CACHE_SIZE, ttl_sec: float = DEFAULT_CACHE_TTL_SEC
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl_sec = ttl_sec
+        self._entries: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        """
+        :return: The cached value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_sec, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def format_time_range(chunk: dict) -> str:
+    start, end = chunk.get("start"), chunk.get("end")
+    if start is None:
+        return ""
+    return f" ({start} - {end})"
+
+
+def build_messages(question: str, chunks: list[dict]) -> list[dict]:
+    """
+    Assembles the chat prompt: the question, with the retrieved chunks as numbered excerpts
+    labeled with their video and time range for the model to cite.
+
+    :param question: User question
+    :param chunks: Retrieved chunks, best first
+    :return: Chat messages
+    """
+    excerpts = [
+        f"[{i}] {chunk.get('title')}{format_time_range(chunk)}: {chunk.get('chunk')}"
+        for i, chunk in enumerate(chunks, start=1)
+    ]
+    content = "\n\n".join(["Transcript excerpts:", *excerpts, f"Question: {question}"])
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": content},
+    ]
+
+
+def citations(chunks: list[dict]) -> list[dict]:
+    """
+    :param chunks: Retrieved chunks, in prompt order
+    :return: One citation per excerpt number, with the video and time range of the chunk
+    """
+    return [
+        {
+            "id": i,
+            "video_id": chunk.get("parent_id"),
+            "title": chunk.get("title"),
+            "start": chunk.get("start"),
+            "end": chunk.get("end"),
+            "chunk_id": chunk.get("chunk_id"),
+        }
+        for i, chunk in enumerate(chunks, start=1)
+    ]
+
+
+class RagService:
+    """
+    Answers questions about the indexed transcripts: retrieves the top chunks, prompts the chat
+    model with them and streams its answer. Retrieval results and answers are cached by normalized
+    question and index version, and expire with their time to live. The index version only tracks
+    the ETL's own writes (see `manifest_version`), so cached entries can still lag behind the index
+    until they expire.
+    """
+
+    def __init__(
+        self,
+        retriever: Retriever,
+        chat_model: ChatModel,
+        top: int = DEFAULT_TOP,
+        index_version: Optional[Callable[[], str]] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        cache_ttl_sec: float = DEFAULT_CACHE_TTL_SEC,
+        index_version_ttl_sec: float = DEFAULT_INDEX_VERSION_TTL_SEC,
+    ) -> None:
+        """
+        :param retriever: Retriever of the index's chunks, e.g. `HybridRetriever`
+        :param chat_model: Chat model, e.g. `AzureOpenAIChatModel` or `ExtractiveChatModel`
+        :param top: Number of chunks in the prompt
+        :param index_version: Returns a value that changes whenever the index content changes.
+            If not provided, cached entries only expire with their time to live
+        :param cache_size: Maximum number of cached retrieval results, and of cached answers
+        :param cache_ttl_sec: Time to live of cached retrieval results and answers
+        :param index_version_ttl_sec: How long the index version is reused before it is checked again
+        """
+        self.retriever = retriever
+        self.chat_model = chat_model
+        self.top = top
+        self.index_version = index_version
+        self.index_version_ttl_sec = index_version_ttl_sec
+        self.retrieval_cache = TTLCache(cache_size, cache_ttl_sec)
+        self.answer_cache = TTLCache(cache_size, cache_ttl_sec)
+        self._version = None
+        self._version_expires_at = 0.0
+        self._version_lock = threading.Lock()
+
+    def _get_index_version(self) -> Optional[str]:
+        if self.index_version is None:
+            return None
+        with self._version_lock:
+            if time.monotonic() >= self._version_expires_at:
+                self._version = self.index_version()
+                self._version_expires_at = time.monotonic() + self.index_version_ttl_sec
+            return self._version
+
+    def _cache_key(self, question: str, filter: Optional[str]) -> tuple:
+        return (self._get_index_version(), normalize_query(question), self.top, filter)
+
+    def retrieve(self, question: str, filter: Optional[str] = None) -> list[dict]:
+        """
+        :param question: User question
+        :param filter: OData filter of the chunks, e.g. "parent_id eq '<video id>'"
+        :return: Top chunks for the question, best first
+        """
+        key = self._cache_key(question, filter)
+        chunks = self.retrieval_cache.get(key)
+        if chunks is None:
+            chunks = self.retriever.retrieve(question, top=self.top, filter=filter)
+            self.retrieval_cache.put(key, chunks)
+        return chunks
+
+    def stream_answer(
+        self, question: str, filter: Optional[str] = None
+    ) -> tuple[list[dict], Iterator[str]]:
+        """
+        :param question: User question
+        :param filter: OData filter of the chunks
+        :return: Citations of the prompt's excerpts, and a generator of the answer's tokens. The
+            answer is cached once the generator is exhausted
+        """
+        key = self._cache_key(question, filter)
+        chunks = self.retrieve(question, filter)
+
+        cached = self.answer_cache.get(key)
+        if cached is not None:
+            logging.info("Answering from the cache.")
+            return citations(chunks), iter([cached])
+
+        def generate() -> Iterator[str]:
+            tokens = []
+            for token in self.chat_model.stream(build_messages(question, chunks)):
+                tokens.append(token)
+                yield token
+            self.answer_cache.put(key, "".join(tokens))
+
+        return citations(chunks), generate()
+
+    def answer(self, question: str, filter: Optional[str] = None) -> dict:
+        """
+        :param question: User question
+        :param filter: OData filter of the chunks
+        :return: {"answer": ..., "citations": [...]}
+        """
+        cited, tokens = self.stream_answer(question, filter)
+        return {"answer": "".join(tokens), "citations": cited}
+
+
+def manifest_version(blob_client: BlobClient) -> Callable[[], str]:
+    """
+    :param blob_client: Client of the ETL's index version blob
+    :return: Index version function returning the blob's ETag, which changes when the ETL records a
+        transcript whose content changed. In push mode that is once its documents are uploaded; in
+        pull mode the indexer picks the transcript up later, and with `ETLIncremental` set to
+        `false` nothing is recorded, so cached entries then only expire with their time to live
+    """
+
+    def get_version() -> str:
+        try:
+            return blob_client.get_blob_properties().etag
+        except ResourceNotFoundError:
+            return ""
+
+    return get_version
+
+
+def create_rag_service(config: Optional[Mapping] = None) -> RagService:
+    """
+    Creates the query service from the configuration in Azure App Configuration.
+
+    :param config: Configuration. If not provided, it is loaded from Azure App Configuration
+    :return: Query service
+    """
+    credential = DefaultAzureCredential()
+    if config is None:
+        config = load_configuration(credential)
+    session = requests.Session()
+
+    # Structured transcripts, prompt content sections and pushed chunks carry their time range,
+    # used for citations
+    select = DEFAULT_SELECT
+    if (
+        config.get("TranscriptFormat", "text") != "text"
+        or config.get("ETLSourceMode", "transcript") == "prompt_content"
+        or str(config.get("SearchPushMode", "false")).lower() == "true"
+    ):
+        select = DEFAULT_SELECT + TIME_FIELDS
+
+    retriever = HybridRetriever(
+        SearchClient(
+            config["SearchEndpoint"],
+            config.get("SearchIndexName", DEFAULT_INDEX_NAME),
+            credential,
+        ),
+        create_embedder(config, credential, session),
+        semantic_configuration=config.get("SearchSemanticConfiguration"),
+        select=select,
+    )
+
+    if config.get("ChatProvider", "azure_openai") == "local":
+        chat_model = ExtractiveChatModel()
+    else:
+        chat_model = AzureOpenAIChatModel(
+            config["OpenAIEndpoint"],
+            credential,
+            deployment=config.get("ChatDeployment", DEFAULT_CHAT_MODEL),
+            session=session,
+        )
+
+    blob_service_client = BlobServiceClient(
+        config["TranscriptsStorageURL"], credential=credential
+    )
+    return RagService(
+        retriever,
+        chat_model,
+        top=int(config.get("RAGTopK", DEFAULT_TOP)),
+        index_version=manifest_version(
+            blob_service_client.get_blob_client(
+                config.get("ETLStateContainerName", DEFAULT_STATE_CONTAINER_NAME),
+                INDEX_VERSION_BLOB_NAME,
+            )
+        ),
+        cache_ttl_sec=float(config.get("RAGCacheTTLSeconds", DEFAULT_CACHE_TTL_SEC)),
+    )
+
+
+_service: Optional[RagService] = None
+_service_lock = threading.Lock()
+
+
+def get_rag_service() -> RagService:
+    """
+    Gets the query service, creating it once per worker process so warm invocations reuse its
+    clients and caches.
+
+    :return: Query service
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = create_rag_service()
+        return _service
@@ -0,0 +1,274 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+import logging
+import random
+import threading
+import time
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+
+# Video Indexer throttles each account at 10 requests per second (and returns 429 beyond it)
+DEFAULT_REQUESTS_PER_SECOND = 10.0
+DEFAULT_BURST = 10
+RETRY_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+# Methods safe to resend after a failure that may have reached the server
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request while the circuit breaker is open
+    """
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: allows `rate` requests per second on average, with bursts of up to
+    `burst` requests.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Block until a request may be sent
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stop handing out tokens for `seconds`, e.g. when the server asks us to back off
+        """
+        with self._lock:
+            # Refill up to now first, so the pause is not shortened by the time since the last request
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Concurrent pauses overlap rather than add up
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests after `failure_threshold` consecutive failures, for `reset_timeout_sec`.
+    After the timeout a single trial request is let through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 10, reset_timeout_sec: float = 60) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_sec = reset_timeout_sec
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_request(self) -> None:
+        """
+        :raises CircuitOpenError: If the circuit is open
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if (
+                time.monotonic() - self._opened_at < self.reset_timeout_sec
+                or self._trial_in_flight
+            ):
+                raise CircuitOpenError(
+                    f"Circuit open after {self._failures} consecutive failures."
+                )
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logging.warning(
+                        f"Opening circuit for {self.reset_timeout_sec} seconds after {self._failures} failures."
+                    )
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 6
+    backoff_base_sec: float = 1.0
+    backoff_max_sec: float = 60.0
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Exponential backoff with full jitter for the given (1-based) attempt
+        """
+        return random.uniform(
+            0, min(self.backoff_max_sec, self.backoff_base_sec * 2 ** (attempt - 1))
+        )
+
+
+def get_retry_after(response: requests.Response) -> Optional[float]:
+    """
+    Parse the `Retry-After` header, given either in seconds or as an HTTP date
+
+    :return: Seconds to wait, or None if the header is missing or invalid
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def failed_before_sending(error: requests.RequestException) -> bool:
+    """
+    :param error: Error raised while sending a request
+    :return: True if no connection was established, so the request never reached the server. Other
+        connection errors, e.g. "Connection aborted", may happen after the request was sent
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    # requests wraps urllib3's error, usually in a MaxRetryError with the cause as its reason
+    cause = error.args[0] if error.args else None
+    return isinstance(getattr(cause, "reason", cause), NewConnectionError)
+
+
+class RequestPolicy:
+    """
+    Shared request layer: rate limits outgoing requests with a token bucket, retries throttled (429),
+    transient (5xx) and connection failures with `Retry-After`-aware exponential backoff and jitter,
+    and stops calling a failing service through a circuit breaker.
+
+    Non-idempotent requests (e.g. `POST` uploads) may have been processed when a 5xx or timeout comes
+    back, so they are only retried when throttled or when the connection failed before the request
+    was sent.
+    """
+
+    def __init__(
+        self,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.rate_limiter = (
+            rate_limiter
+            if rate_limiter is not None
+            else RateLimiter(DEFAULT_REQUESTS_PER_SECOND, DEFAULT_BURST)
+        )
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.circuit_breaker = (
+            circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        )
+
+    def send(
+        self,
+        send: Callable[..., requests.Response],
+        method: str,
+        url: str,
+        idempotent: Optional[bool] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Send a request, retrying it as needed. Responses with non-retryable error statuses are returned
+        as they are, so callers keep handling them (e.g. `raise_for_status()`, 404 checks).
+
+        :param send: Function sending the request, e.g. `session.request`
+        :param method: HTTP method
+        :param url: Request URL
+        :param idempotent: Whether the request is safe to resend after a failure that may have reached
+            the server. If not provided, it is inferred from the method (see `IDEMPOTENT_METHODS`)
+        :return: The final response
+        :raises CircuitOpenError: If the circuit breaker is open
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+
+        attempt = 0
+        while True:
+            attempt += 1
+            self.circuit_breaker.before_request()
+            self.rate_limiter.acquire()
+
+            # Rewind uploaded files, which the previous attempt consumed
+            for file in (kwargs.get("files") or {}).values():
+                if hasattr(file, "seek"):
+                    file.seek(0)
+
+            try:
+                response = send(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                self.circuit_breaker.record_failure()
+                # Unless the connection was never established, the request may have been processed
+                if attempt >= self.retry_policy.max_attempts or (
+                    not idempotent and not failed_before_sending(error)
+                ):
+                    raise
+                delay = self.retry_policy.backoff(attempt)
+                logging.warning(
+                    f"{method} request failed with {type(error).__name__}. Retrying in {delay:.1f} seconds."
+                )
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in RETRY_STATUS_CODES:
+                self.circuit_breaker.record_success()
+                return response
+
+            # Throttling means the service is healthy but busy, so it does not count towards the breaker
+            if response.status_code == 429:
+                self.circuit_breaker.record_success()
+            else:
+                self.circuit_breaker.record_failure()
+
+            if attempt >= self.retry_policy.max_attempts or (
+                not idempotent and response.status_code != 429
+            ):
+                return response
+
+            retry_after = get_retry_after(response)
+            delay = (
+                retry_after
+                if retry_after is not None
+                else self.retry_policy.backoff(attempt)
+            )
+            if response.status_code == 429:
+                self.rate_limiter.pause(delay)
+            response.close()
+            logging.warning(
+                f"{method} request returned {response.status_code}. Retrying in {delay:.1f} seconds "
+                + f"(attempt {attempt} of {self.retry_policy.max_attempts})."
+            )
+            time.sleep(delay)
@@ -0,0 +1,151 @@
+from collections import OrderedDict
+from typing import Optional
+import logging
+import re
+import threading
+
+from azure.search.documents import SearchClient
+from azure.search.documents.models import VectorizedQuery
+
+from embeddings import Embedder, embedding_cache_key
+
+
+DEFAULT_TOP = 5
+DEFAULT_K_NEAREST_NEIGHBORS = 50
+DEFAULT_QUERY_CACHE_SIZE = 1024
+SEMANTIC_CONFIGURATION_NAME = "mySemanticConfig"
+# Fields of every index; structured transcripts (jsonl, chunks, push mode) add TIME_FIELDS
+DEFAULT_SELECT = ["chunk_id", "parent_id", "title", "chunk"]
+TIME_FIELDS = ["start", "end", "start_seconds", "end_seconds"]
+
+
+def normalize_query(query: str) -> str:
+    """
+    :return: The query with case and whitespace normalized, so trivially different questions share
+        cache entries
+    """
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe in-memory LRU cache of query embeddings, so repeated or popular questions skip the
+    embedding call.
+    """
+
+    def __init__(
+        self, embedder: Embedder, maxsize: int = DEFAULT_QUERY_CACHE_SIZE
+    ) -> None:
+        """
+        :param embedder: Embedding model of the index's documents
+        :param maxsize: Maximum number of cached embeddings
+        """
+        self.embedder = embedder
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed(self, query: str) -> list[float]:
+        """
+        :param query: Query text
+        :return: Embedding of the query. Queries differing only in case and whitespace share a cache
+            entry, the embedding of the first one seen
+        """
+        # Normalized text only keys the cache; the model is given the query as typed
+        key = embedding_cache_key(
+            self.embedder.model, self.embedder.dimensions, normalize_query(query)
+        )
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        # Embed outside the lock; concurrent misses for the same query are rare and harmless
+        vector = self.embedder.embed([query])[0]
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return vector
+
+
+class HybridRetriever:
+    """
+    Retrieves transcript chunks with hybrid queries: BM25 full-text search of the chunk text and a
+    vector search of its embedding, fused by the search service with Reciprocal Rank Fusion (RRF),
+    optionally reranked by the semantic ranker. Queries are embedded locally through a
+    `QueryEmbeddingCache` rather than by the index's vectorizer, so cached queries need no
+    embedding round-trip.
+    """
+
+    def __init__(
+        self,
+        search_client: SearchClient,
+        embedder: Embedder,
+        semantic_configuration: Optional[str] = None,
+        k_nearest_neighbors: int = DEFAULT_K_NEAREST_NEIGHBORS,
+        select: Optional[list[str]] = None,
+        query_cache_size: int = DEFAULT_QUERY_CACHE_SIZE,
+    ) -> None:
+        """
+        :param search_client: Search client for the index
+        :param embedder: Embedding model the index's documents were embedded with
+        :param semantic_configuration: Semantic configuration to rerank results with, e.g.
+            SEMANTIC_CONFIGURATION_NAME. If not provided, results are in RRF order
+        :param k_nearest_neighbors: Number of vector matches fused with the full-text matches
+        :param select: Fields to return. Defaults to DEFAULT_SELECT
+        :param query_cache_size: Maximum number of cached query embeddings
+        """
+        self.search_client = search_client
+        self.query_embeddings = QueryEmbeddingCache(embedder, query_cache_size)
+        self.semantic_configuration = semantic_configuration
+        self.k_nearest_neighbors = k_nearest_neighbors
+        self.select = select if select is not None else DEFAULT_SELECT
+
+    def retrieve(
+        self, query: str, top: int = DEFAULT_TOP, filter: Optional[str] = None
+    ) -> list[dict]:
+        """
+        :param query: Question or keywords
+        :param top: Number of chunks to return
+        :param filter: OData filter, e.g. "parent_id eq '<video id>'"
+        :return: Selected fields of the best chunks, best first, with their "score" (RRF, or the
+            semantic reranker's when enabled)
+        """
+        vector_query = VectorizedQuery(
+            vector=self.query_embeddings.embed(query),
+            k_nearest_neighbors=max(top, self.k_nearest_neighbors),
+            fields="text_vector",
+        )
+        options = {}
+        if self.semantic_configuration:
+            options = {
+                "query_type": "semantic",
+                "semantic_configuration_name": self.semantic_configuration,
+            }
+
+        results = self.search_client.search(
+            search_text=query,
+            vector_queries=[vector_query],
+            filter=filter,
+            select=self.select,
+            top=top,
+            **options,
+        )
+
+        chunks = []
+        for result in results:
+            chunk = {field: result.get(field) for field in self.select}
+            chunk["score"] = result.get("@search.reranker_score") or result.get(
+                "@search.score"
+            )
+            chunks.append(chunk)
+
+        logging.debug(f"Retrieved {len(chunks)} chunks for query: {query}")
+        return chunks
@@ -0,0 +1,112 @@
+from typing import Optional
+import json
+import logging
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContainerClient, ContentSettings
+
+
+RUNS_PREFIX = "runs"
+
+
+def _run_blob_name(run_id: str) -> str:
+    return f"{RUNS_PREFIX}/{run_id}/run.json"
+
+
+def _batch_prefix(run_id: str) -> str:
+    return f"{RUNS_PREFIX}/{run_id}/batches/"
+
+
+def _load_run(container_client: ContainerClient, run_id: str) -> Optional[dict]:
+    try:
+        return json.loads(
+            container_client.download_blob(_run_blob_name(run_id)).readall()
+        )
+    except ResourceNotFoundError:
+        return None
+
+
+def start_run(
+    container_client: ContainerClient, run_id: str, batch_count: int, video_count: int
+) -> None:
+    """
+    Records a fanned-out run, so its completion can be tallied from the batch results.
+
+    :param container_client: Container client for the ETL state container
+    :param run_id: The run ID
+    :param batch_count: Number of batches enqueued for the run
+    :param video_count: Number of videos enqueued for the run
+    """
+    container_client.upload_blob(
+        _run_blob_name(run_id),
+        json.dumps(
+            {"run_id": run_id, "batch_count": batch_count, "video_count": video_count}
+        ),
+        overwrite=True,
+        content_settings=ContentSettings(content_type="application/json"),
+    )
+
+
+def record_batch(
+    container_client: ContainerClient,
+    run_id: str,
+    batch_index: int,
+    summary: dict[str, int],
+) -> Optional[dict]:
+    """
+    Records the result of a batch. Each batch writes its own blob, so a redelivered batch overwrites
+    its previous result instead of being counted twice.
+
+    :param container_client: Container client for the ETL state container
+    :param run_id: The run ID
+    :param batch_index: Index of the batch within the run
+    :param summary: Number of processed, skipped and failed videos of the batch
+    :return: The run tally if this batch completed the run, otherwise None
+    """
+    container_client.upload_blob(
+        f"{_batch_prefix(run_id)}{batch_index:06d}.json",
+        json.dumps(summary),
+        overwrite=True,
+        content_settings=ContentSettings(content_type="application/json"),
+    )
+
+    # Only count the result blobs here; their contents are read once the run is complete
+    completed_batches = sum(
+        1 for _ in container_client.list_blob_names(name_starts_with=_batch_prefix(run_id))
+    )
+    run = _load_run(container_client, run_id)
+    if run is None or completed_batches < run["batch_count"]:
+        return None
+
+    tally = get_run_tally(container_client, run_id)
+    if tally is not None and tally["completed_batches"] == tally["batch_count"]:
+        logging.info(
+            f"Run {run_id} completed: processed {tally['processed']}, skipped {tally['skipped']}, "
+            + f"deferred {tally['deferred']} and failed {tally['failed']} of {tally['video_count']} videos."
+        )
+        return tally
+    return None
+
+
+def get_run_tally(container_client: ContainerClient, run_id: str) -> Optional[dict]:
+    """
+    Sums up the batch results of a run.
+
+    :param container_client: Container client for the ETL state container
+    :param run_id: The run ID
+    :return: The run's batch and video counts with the processed/skipped/deferred/failed totals so
+        far, or None if the run does not exist
+    """
+    tally = _load_run(container_client, run_id)
+    if tally is None:
+        return None
+
+    tally.update(
+        {"completed_batches": 0, "processed": 0, "skipped": 0, "deferred": 0, "failed": 0}
+    )
+    for blob in container_client.list_blobs(name_starts_with=_batch_prefix(run_id)):
+        summary = json.loads(container_client.download_blob(blob.name).readall())
+        tally["completed_batches"] += 1
+        for key in ("processed", "skipped", "deferred", "failed"):
+            tally[key] += summary.get(key, 0)
+    return tally
@@ -0,0 +1,136 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import base64
+import hashlib
+import logging
+import mmap
+import os
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import (
+    BlobBlock,
+    BlobClient,
+    BlobSasPermissions,
+    BlobServiceClient,
+    generate_blob_sas,
+)
+
+
+DEFAULT_STAGING_CONTAINER_NAME = "video-staging"
+DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 8
+# Video Indexer downloads the video when the upload is submitted, but may retry later
+DEFAULT_SAS_EXPIRY = timedelta(hours=12)
+FINGERPRINT_METADATA_KEY = "source_fingerprint"
+
+
+def file_fingerprint(path: str, block_size: int) -> str:
+    """
+    :return: Identifier of the file's version and block layout, from its size and modification time
+    """
+    stat = os.stat(path)
+    return hashlib.sha256(
+        f"{stat.st_size}:{stat.st_mtime_ns}:{block_size}".encode("utf-8")
+    ).hexdigest()[:16]
+
+
+def block_id(fingerprint: str, index: int) -> str:
+    # Block IDs of a blob must all have the same length; the fingerprint keeps blocks staged from
+    # another version of the file from being reused
+    return base64.b64encode(f"{fingerprint}-{index:08d}".encode("utf-8")).decode("utf-8")
+
+
+def stage_file(
+    blob_client: BlobClient,
+    path: str,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> None:
+    """
+    Uploads a local file to a block blob in parallel blocks, read from a memory map so at most
+    `max_concurrency` blocks are in memory at a time. The upload is resumable: blocks already
+    staged by an interrupted upload of the same file are not sent again, and a blob already
+    committed from the same file is left as is.
+
+    :param blob_client: Client of the destination blob
+    :param path: Path of the local file
+    :param block_size: Size of each block, in bytes
+    :param max_concurrency: Number of blocks uploaded in parallel
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        raise ValueError(f"Cannot stage the empty file {path}")
+    fingerprint = file_fingerprint(path, block_size)
+
+    try:
+        properties = blob_client.get_blob_properties()
+        if properties.metadata.get(FINGERPRINT_METADATA_KEY) == fingerprint:
+            logging.info(f"{blob_client.blob_name} is already staged.")
+            return
+    except ResourceNotFoundError:
+        pass
+
+    # Uncommitted blocks are kept by the service for a week, so an interrupted upload resumes
+    try:
+        _, uncommitted = blob_client.get_block_list("uncommitted")
+        staged = {block.id for block in uncommitted}
+    except ResourceNotFoundError:
+        staged = set()
+
+    offsets = range(0, size, block_size)
+    block_ids = [block_id(fingerprint, index) for index in range(len(offsets))]
+    pending = [
+        (block_ids[index], offset)
+        for index, offset in enumerate(offsets)
+        if block_ids[index] not in staged
+    ]
+    logging.info(
+        f"Staging {path} to {blob_client.blob_name}: {len(pending)} of {len(block_ids)} blocks "
+        + "to upload."
+    )
+
+    with open(path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as view:
+
+        def stage_block(block: tuple[str, int]) -> None:
+            id, offset = block
+            data = view[offset : offset + block_size]
+            blob_client.stage_block(id, data, length=len(data))
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            list(executor.map(stage_block, pending))
+
+    blob_client.commit_block_list(
+        [BlobBlock(block_id=id) for id in block_ids],
+        metadata={FINGERPRINT_METADATA_KEY: fingerprint},
+    )
+    logging.info(f"Staged {path} to {blob_client.blob_name} ({size} bytes).")
+
+
+def generate_read_sas_url(
+    blob_service_client: BlobServiceClient,
+    blob_client: BlobClient,
+    expiry: timedelta = DEFAULT_SAS_EXPIRY,
+) -> str:
+    """
+    Creates a read-only link to a blob, signed with a user delegation key so no account key is needed.
+    Requires the "Storage Blob Delegator" role (included in "Storage Blob Data Contributor").
+
+    :param blob_service_client: Blob service client authenticated with Microsoft Entra ID
+    :param blob_client: Client of the blob
+    :param expiry: Validity of the link
+    :return: URL of the blob with a SAS token
+    """
+    start = datetime.now(timezone.utc) - timedelta(minutes=5)
+    delegation_key = blob_service_client.get_user_delegation_key(start, start + expiry)
+    sas = generate_blob_sas(
+        blob_client.account_name,
+        blob_client.container_name,
+        blob_client.blob_name,
+        user_delegation_key=delegation_key,
+        permission=BlobSasPermissions(read=True),
+        start=start,
+        expiry=start + expiry,
+    )
+    return f"{blob_client.url}?{sas}"
@@ -0,0 +1,279 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, Optional
+import logging
+import time
+
+from azure.storage.blob import BlobServiceClient
+
+from avi_helpers import (
+    DEFAULT_LIST_PAGE_SIZE,
+    POLL_MAX_INTERVAL_SEC,
+    POLL_MIN_INTERVAL_SEC,
+    VideoIndexerClient,
+    get_processing_progress,
+    next_poll_interval,
+)
+
+
+# Videos uploading or indexing at a time; keep within the account's indexing concurrency
+DEFAULT_MAX_IN_FLIGHT = 10
+DEFAULT_MAX_UPLOADS = 4
+# Videos due for a check within this window are checked in the same list request
+POLL_COALESCE_SEC = 2
+FINAL_STATES = ("Processed", "Failed")
+
+
+@dataclass
+class VideoSubmission:
+    """
+    A video to upload, from a URL or a local file.
+    """
+
+    name: str
+    video_url: Optional[str] = None
+    media_path: Optional[str] = None
+    # Other arguments of the upload method, e.g. excluded_ai, privacy or callback_url
+    options: dict = field(default_factory=dict)
+
+
+@dataclass
+class SubmissionEvent:
+    """
+    Outcome of a submitted video: "Processed", "Failed", "UploadFailed" or "TimedOut".
+    """
+
+    name: str
+    video_id: Optional[str]
+    state: str
+    elapsed_sec: float
+    error: Optional[str] = None
+
+
+@dataclass
+class _TrackedVideo:
+    submission: VideoSubmission
+    video_id: str
+    submitted_at: float
+    next_poll_at: float
+    interval_sec: Optional[float] = None
+    state: Optional[str] = None
+    progress: Optional[int] = None
+
+
+class BatchSubmitter:
+    """
+    Uploads many videos to Video Indexer and tracks their indexing from a single scheduler.
+
+    At most `max_in_flight` videos are uploading or indexing at a time; the next video is uploaded as
+    soon as one finishes. Indexing status is read from the list entries of the videos (see
+    `VideoIndexerClient.iter_videos`), many videos per request, and each video is checked again at an
+    interval adapted to its reported progress. An event is emitted as each video finishes.
+    """
+
+    def __init__(
+        self,
+        client: VideoIndexerClient,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        max_uploads: int = DEFAULT_MAX_UPLOADS,
+        timeout_sec: Optional[float] = None,
+        blob_service_client: Optional[BlobServiceClient] = None,
+        poll_batch_size: int = DEFAULT_LIST_PAGE_SIZE,
+    ) -> None:
+        """
+        :param client: Video Indexer client
+        :param max_in_flight: Maximum number of videos uploading or indexing at a time
+        :param max_uploads: Maximum number of uploads in parallel
+        :param timeout_sec: Time after which a video still indexing is reported as "TimedOut"
+        :param blob_service_client: If provided, local files are staged to blob storage
+            (see `VideoIndexerClient.staged_file_upload_async`) instead of posted
+        :param poll_batch_size: Maximum number of videos checked per list request
+        """
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.max_uploads = max_uploads
+        self.timeout_sec = timeout_sec
+        self.blob_service_client = blob_service_client
+        self.poll_batch_size = poll_batch_size
+
+    def _upload(self, submission: VideoSubmission) -> str:
+        if submission.video_url is not None:
+            video_id = self.client.upload_url_async(
+                submission.name, submission.video_url, **submission.options
+            )
+        elif self.blob_service_client is not None:
+            video_id = self.client.staged_file_upload_async(
+                submission.media_path,
+                self.blob_service_client,
+                video_name=submission.name,
+                **submission.options,
+            )
+        else:
+            video_id = self.client.file_upload_async(
+                submission.media_path, video_name=submission.name, **submission.options
+            )
+        # Reported as "UploadFailed": a video without an ID cannot be tracked, and listing it
+        # would fail the status checks of the whole batch
+        if not video_id:
+            raise ValueError(f"The upload of {submission.name} returned no video ID")
+        return video_id
+
+    def _poll(self, due: list[_TrackedVideo]) -> list[SubmissionEvent]:
+        entries = {}
+        for i in range(0, len(due), self.poll_batch_size):
+            ids = [video.video_id for video in due[i : i + self.poll_batch_size]]
+            for entry in self.client.iter_videos(ids=ids, page_size=len(ids)):
+                entries[entry["id"]] = entry
+
+        events = []
+        now = time.monotonic()
+        for video in due:
+            elapsed = now - video.submitted_at
+            # A just-uploaded video may not be listed yet; keep checking until it is
+            entry = entries.get(video.video_id)
+            if entry is not None:
+                video.state = entry.get("state")
+                video.progress = get_processing_progress(entry)
+
+            if video.state in FINAL_STATES:
+                events.append(
+                    SubmissionEvent(
+                        video.submission.name, video.video_id, video.state, elapsed
+                    )
+                )
+            elif self.timeout_sec is not None and elapsed > self.timeout_sec:
+                events.append(
+                    SubmissionEvent(
+                        video.submission.name,
+                        video.video_id,
+                        "TimedOut",
+                        elapsed,
+                        error=f"Still {video.state} ({video.progress or 0}%)",
+                    )
+                )
+            else:
+                video.interval_sec = next_poll_interval(
+                    video.progress, elapsed, video.interval_sec
+                )
+                video.next_poll_at = now + video.interval_sec
+        return events
+
+    def _poll_failed(
+        self, due: list[_TrackedVideo], error: Exception
+    ) -> list[SubmissionEvent]:
+        # The videos are still indexing as far as we know: check them again later, backing off while
+        # the status cannot be read (e.g. the circuit breaker is open), unless they timed out
+        logging.warning(
+            f"Could not check the status of {len(due)} videos: {error}. Checking again later."
+        )
+        events = []
+        now = time.monotonic()
+        for video in due:
+            elapsed = now - video.submitted_at
+            if self.timeout_sec is not None and elapsed > self.timeout_sec:
+                events.append(
+                    SubmissionEvent(
+                        video.submission.name,
+                        video.video_id,
+                        "TimedOut",
+                        elapsed,
+                        error=f"Status unavailable: {error}",
+                    )
+                )
+                continue
+            video.interval_sec = min(
+                2 * (video.interval_sec or POLL_MIN_INTERVAL_SEC), POLL_MAX_INTERVAL_SEC
+            )
+            video.next_poll_at = now + video.interval_sec
+        return events
+
+    def run(
+        self,
+        submissions: Iterable[VideoSubmission],
+        on_event: Optional[Callable[[SubmissionEvent], None]] = None,
+    ) -> Iterator[SubmissionEvent]:
+        """
+        Uploads the videos and waits for them to be indexed.
+
+        :param submissions: Videos to upload, consumed lazily as slots free up
+        :param on_event: Called with each event as it is emitted, e.g. to enqueue the video for
+            transcript extraction
+        :return: Generator of one event per video, in order of completion
+        """
+        submissions = iter(submissions)
+        exhausted = False
+        uploads: dict[Future, tuple[VideoSubmission, float]] = {}
+        in_flight: dict[str, _TrackedVideo] = {}
+
+        def emit(event: SubmissionEvent) -> SubmissionEvent:
+            logging.info(
+                f"Video {event.name} ({event.video_id}) finished as {event.state} "
+                + f"after {event.elapsed_sec:.0f}s."
+            )
+            if on_event is not None:
+                on_event(event)
+            return event
+
+        with ThreadPoolExecutor(max_workers=self.max_uploads) as executor:
+            while True:
+                # Start uploads while under the limit of videos uploading or indexing
+                while not exhausted and len(uploads) + len(in_flight) < self.max_in_flight:
+                    submission = next(submissions, None)
+                    if submission is None:
+                        exhausted = True
+                        break
+                    future = executor.submit(self._upload, submission)
+                    uploads[future] = (submission, time.monotonic())
+
+                # Start tracking the uploaded videos
+                for future in [future for future in uploads if future.done()]:
+                    submission, submitted_at = uploads.pop(future)
+                    try:
+                        video_id = future.result()
+                    except Exception as e:
+                        yield emit(
+                            SubmissionEvent(
+                                submission.name,
+                                None,
+                                "UploadFailed",
+                                time.monotonic() - submitted_at,
+                                error=str(e),
+                            )
+                        )
+                        continue
+                    in_flight[video_id] = _TrackedVideo(
+                        submission,
+                        video_id,
+                        submitted_at,
+                        next_poll_at=time.monotonic() + POLL_MIN_INTERVAL_SEC,
+                    )
+
+                if exhausted and not uploads and not in_flight:
+                    break
+
+                now = time.monotonic()
+                due = [
+                    video
+                    for video in in_flight.values()
+                    if video.next_poll_at <= now + POLL_COALESCE_SEC
+                ]
+                if due:
+                    try:
+                        events = self._poll(due)
+                    except Exception as e:
+                        events = self._poll_failed(due, e)
+                    for event in events:
+                        del in_flight[event.video_id]
+                        yield emit(event)
+                    continue
+
+                # Sleep until the next check is due or an upload completes
+                timeout = (
+                    min(video.next_poll_at for video in in_flight.values()) - now
+                    if in_flight
+                    else None
+                )
+                if uploads:
+                    wait(uploads, timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(timeout)
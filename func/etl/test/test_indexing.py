@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+import indexing
+from indexing import BulkIndexer
+
+
+class ReorderingSearchClient:
+    """
+    Returns results in reverse order, failing the first attempt of one document with a 503
+    """
+
+    def __init__(self, flaky_key: str) -> None:
+        self.flaky_key = flaky_key
+        self.batches = []
+
+    def merge_or_upload_documents(self, batch):
+        self.batches.append([document["chunk_id"] for document in batch])
+        results = [
+            SimpleNamespace(
+                key=document["chunk_id"],
+                succeeded=not (document["chunk_id"] == self.flaky_key and len(self.batches) == 1),
+                status_code=503,
+                error_message="busy",
+            )
+            for document in batch
+        ]
+        return list(reversed(results))
+
+
+def test_retries_the_failed_document_whatever_the_result_order(monkeypatch) -> None:
+    monkeypatch.setattr(indexing.time, "sleep", lambda seconds: None)
+    client = ReorderingSearchClient(flaky_key="v_00000")
+
+    with BulkIndexer(client) as indexer:
+        indexer.add({"chunk_id": f"v_{i:05d}"} for i in range(3))
+
+    assert client.batches[1] == ["v_00000"]
+    assert indexer.uploaded == 3
@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+from azure.core.exceptions import ResourceNotFoundError
+
+from manifest import INDEX_VERSION_BLOB_NAME, TranscriptManifest
+
+
+class FakeContainer:
+    def __init__(self) -> None:
+        self.blobs = {}
+
+    def upload_blob(self, name, data, overwrite=False, metadata=None, **kwargs) -> None:
+        self.blobs[name] = (data, metadata or {})
+
+    def list_blobs(self, name_starts_with="", include=None):
+        return [
+            SimpleNamespace(name=name, metadata=metadata)
+            for name, (_, metadata) in self.blobs.items()
+            if name.startswith(name_starts_with)
+        ]
+
+    def download_blob(self, name):
+        if name not in self.blobs:
+            raise ResourceNotFoundError(name)
+        return SimpleNamespace(readall=lambda: self.blobs[name][0])
+
+
+VIDEO = {"id": "video", "name": "Video", "lastModified": "2024-01-01T00:00:00Z"}
+
+
+def saves_bump_version(container: FakeContainer, manifest: TranscriptManifest, **record) -> bool:
+    container.blobs.pop(INDEX_VERSION_BLOB_NAME, None)
+    manifest.record(VIDEO, blob_name="Video.txt", **record)
+    manifest.save()
+    return INDEX_VERSION_BLOB_NAME in container.blobs
+
+
+def test_index_version_changes_only_with_content() -> None:
+    container = FakeContainer()
+    manifest = TranscriptManifest.load(container)
+
+    assert not saves_bump_version(container, manifest, transcript_hash="")
+    assert saves_bump_version(container, manifest, transcript_hash="a")
+    assert not saves_bump_version(container, manifest, transcript_hash="a")
+    assert saves_bump_version(container, manifest, transcript_hash="a", indexed_hash="a")
+    assert not saves_bump_version(container, manifest, transcript_hash="a", indexed_hash="a")
+
+
+def test_entries_are_read_back_from_listing() -> None:
+    container = FakeContainer()
+    manifest = TranscriptManifest.load(container)
+    manifest.record(VIDEO, transcript_hash="a", blob_name="Video.txt")
+    manifest.save()
+
+    loaded = TranscriptManifest.load(container)
+    assert not loaded.needs_processing(VIDEO, "Video.txt")
+    assert loaded.needs_processing(VIDEO, "Video.txt", require_indexed=True)
+    assert TranscriptManifest(container).get("video") == loaded.get("video")
+
+
+def test_compression_change_needs_processing() -> None:
+    manifest = TranscriptManifest.load(FakeContainer())
+    manifest.record(VIDEO, transcript_hash="hash", blob_name="Video.txt")
+
+    assert not manifest.needs_processing(VIDEO, "Video.txt")
+    assert manifest.needs_processing(VIDEO, "Video.txt", content_encoding="gzip")
+
+    manifest.record(
+        VIDEO, transcript_hash="hash", blob_name="Video.txt", content_encoding="gzip"
+    )
+    assert not manifest.needs_processing(VIDEO, "Video.txt", content_encoding="gzip")
+    assert manifest.needs_processing(VIDEO, "Video.txt")
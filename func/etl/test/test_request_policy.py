@@ -0,0 +1,109 @@
+from http.client import RemoteDisconnected
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+import request_policy
+from request_policy import RateLimiter, RequestPolicy, RetryPolicy
+
+
+# Stands in for the `time` module; rates below are powers of two so waits add up exactly
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.slept = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(request_policy, "time", clock)
+    return clock
+
+
+@pytest.mark.parametrize("idle_sec", [0.0, 2.0, 60.0])
+def test_pause_is_not_shortened_by_idle_time(clock: FakeClock, idle_sec: float) -> None:
+    limiter = RateLimiter(rate=8, burst=8)
+    limiter.acquire()
+    clock.now += idle_sec
+
+    limiter.pause(5)
+    paused_at = clock.now
+    limiter.acquire()
+
+    assert clock.now - paused_at >= 5
+
+
+def test_concurrent_pauses_do_not_add_up(clock: FakeClock) -> None:
+    limiter = RateLimiter(rate=8, burst=8)
+    for _ in range(3):
+        limiter.pause(5)
+    limiter.acquire()
+
+    assert 5 <= clock.slept < 6
+
+
+def policy() -> RequestPolicy:
+    return RequestPolicy(
+        rate_limiter=RateLimiter(rate=8, burst=8),
+        retry_policy=RetryPolicy(max_attempts=3),
+    )
+
+
+def connection_error(reason: Exception) -> requests.ConnectionError:
+    return requests.ConnectionError(MaxRetryError(None, "https://example.com", reason))
+
+
+def failing_send(error: Exception):
+    calls = []
+
+    def send(method: str, url: str, **kwargs) -> requests.Response:
+        calls.append(method)
+        raise error
+
+    return send, calls
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        connection_error(ProtocolError("Connection aborted.", RemoteDisconnected())),
+        requests.ReadTimeout(),
+    ],
+)
+def test_post_is_not_resent_after_it_may_have_been_sent(clock: FakeClock, error) -> None:
+    send, calls = failing_send(error)
+    with pytest.raises(type(error)):
+        policy().send(send, "POST", "https://example.com")
+    assert calls == ["POST"]
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        connection_error(NewConnectionError(None, "Failed to establish a new connection")),
+        requests.ConnectTimeout(),
+    ],
+)
+def test_post_is_retried_when_never_sent(clock: FakeClock, error) -> None:
+    send, calls = failing_send(error)
+    with pytest.raises(type(error)):
+        policy().send(send, "POST", "https://example.com")
+    assert calls == ["POST"] * 3
+
+
+def test_get_is_retried_after_connection_reset(clock: FakeClock) -> None:
+    send, calls = failing_send(
+        connection_error(ProtocolError("Connection aborted.", RemoteDisconnected()))
+    )
+    with pytest.raises(requests.ConnectionError):
+        policy().send(send, "GET", "https://example.com")
+    assert calls == ["GET"] * 3
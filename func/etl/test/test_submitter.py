@@ -0,0 +1,31 @@
+import submitter
+from submitter import BatchSubmitter, VideoSubmission
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.polled_ids = []
+
+    def upload_url_async(self, name, video_url, **kwargs):
+        return None if name == "missing" else f"{name}-id"
+
+    def iter_videos(self, ids, page_size):
+        self.polled_ids.append(ids)
+        assert None not in ids
+        return [{"id": video_id, "state": "Processed"} for video_id in ids]
+
+
+def test_upload_without_video_id_fails_only_that_video(monkeypatch) -> None:
+    monkeypatch.setattr(submitter, "POLL_MIN_INTERVAL_SEC", 0)
+    client = FakeClient()
+    submissions = [
+        VideoSubmission(name, video_url=f"https://example.com/{name}.mp4")
+        for name in ("first", "missing", "second")
+    ]
+
+    events = {event.name: event for event in BatchSubmitter(client).run(submissions)}
+
+    assert events["missing"].state == "UploadFailed"
+    assert events["missing"].video_id is None
+    assert events["first"].state == "Processed"
+    assert events["second"].state == "Processed"
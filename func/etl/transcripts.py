@@ -0,0 +1,298 @@
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Optional
+import gzip
+import hashlib
+import json
+
+from chunking import chunk_fragments
+
+
+def parse_timestamp(timestamp: str) -> float:
+    """
+    Converts a Video Indexer timestamp (e.g. `0:01:02.5`) to seconds
+
+    :param timestamp: Timestamp as `[h:]m:s[.fraction]`
+    :return: Number of seconds
+    """
+    seconds = 0.0
+    for part in timestamp.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def render_transcript_lines(video_name: str, fragments: Iterable[dict]) -> Iterator[str]:
+    """
+    Renders a transcript as text lines: a `Video Name:` header followed by one
+    `start - end: text` line per fragment, using the fragment's first instance for the time range.
+
+    :param video_name: The name of the video
+    :param fragments: Transcript fragments, as found under `videos[].insights.transcript`
+    :return: Iterator over the lines, without line terminators
+    """
+    yield f"Video Name: {video_name}"
+    for fragment in fragments:
+        instance = fragment["instances"][0]
+        yield f'{instance["start"]} - {instance["end"]}: {fragment["text"]}'
+
+
+def normalize_fragment(fragment: dict) -> dict:
+    """
+    Flattens a Video Indexer transcript fragment to its text, speaker, confidence and the time range
+    of its first instance (as given and in seconds)
+
+    :param fragment: Transcript fragment, as found under `videos[].insights.transcript`
+    :return: The flattened fragment
+    """
+    instance = fragment["instances"][0]
+    return {
+        "start": instance["start"],
+        "end": instance["end"],
+        "start_seconds": parse_timestamp(instance["start"]),
+        "end_seconds": parse_timestamp(instance["end"]),
+        "text": fragment["text"],
+        "speaker_id": fragment.get("speakerId"),
+        "confidence": fragment.get("confidence"),
+    }
+
+
+def _hashing_writer(buffer: BinaryIO) -> tuple[Callable[[str], None], Any]:
+    digest = hashlib.sha256()
+
+    def write(text: str) -> None:
+        data = text.encode("utf-8")
+        buffer.write(data)
+        digest.update(data)
+
+    return write, digest
+
+
+def write_transcript(
+    video_name: str,
+    fragments: Iterable[dict],
+    buffer: BinaryIO,
+    video_id: Optional[str] = None,
+) -> str:
+    """
+    Streams the rendered transcript into a binary buffer as UTF-8, one line at a time.
+    The output matches `Video Name: <name>\\n` followed by the fragment lines joined with newlines.
+
+    :param video_name: The name of the video
+    :param fragments: Transcript fragments, as found under `videos[].insights.transcript`
+    :param buffer: Writable binary buffer, e.g. `io.BytesIO`, to upload from
+    :param video_id: The video ID. Not part of the text format
+    :return: Hex SHA-256 digest of the written transcript
+    """
+    write, digest = _hashing_writer(buffer)
+    lines = render_transcript_lines(video_name, fragments)
+
+    # The header is always followed by a newline, even for an empty transcript
+    write(next(lines) + "\n")
+    for i, line in enumerate(lines):
+        write(line if i == 0 else "\n" + line)
+
+    return digest.hexdigest()
+
+
+def write_transcript_jsonl(
+    video_name: str,
+    fragments: Iterable[dict],
+    buffer: BinaryIO,
+    video_id: Optional[str] = None,
+) -> str:
+    """
+    Streams the transcript into a binary buffer as JSON Lines, one fragment per line with its
+    timestamps (as given and in seconds), text, speaker and confidence.
+
+    :param video_name: The name of the video
+    :param fragments: Transcript fragments, as found under `videos[].insights.transcript`
+    :param buffer: Writable binary buffer, e.g. `io.BytesIO`, to upload from
+    :param video_id: The video ID
+    :return: Hex SHA-256 digest of the written transcript
+    """
+    write, digest = _hashing_writer(buffer)
+    for fragment in fragments:
+        line = {"video_id": video_id, "video_name": video_name}
+        line.update(normalize_fragment(fragment))
+        write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    return digest.hexdigest()
+
+
+def chunk_documents(
+    video_name: str,
+    fragments: Iterable[dict],
+    video_id: Optional[str] = None,
+    **chunk_options,
+) -> Iterator[dict]:
+    """
+    Chunks the transcript into index documents (`chunk_id`, `parent_id`, `title`, `chunk` and the
+    chunk's time range), see `chunking.chunk_fragments`.
+
+    :param video_name: The name of the video
+    :param fragments: Transcript fragments, as found under `videos[].insights.transcript`
+    :param video_id: The video ID, used as the parent ID and in the chunk IDs
+    :param chunk_options: Options of `chunking.chunk_fragments`, e.g. `max_tokens`
+    :return: Iterator over the documents, in transcript order
+    """
+    chunks = chunk_fragments(map(normalize_fragment, fragments), **chunk_options)
+    for i, chunk in enumerate(chunks):
+        yield {
+            "chunk_id": f"{video_id}_{i:05d}",
+            "parent_id": video_id,
+            "title": video_name,
+            "chunk": chunk.text,
+            "start": chunk.start,
+            "end": chunk.end,
+            "start_seconds": chunk.start_seconds,
+            "end_seconds": chunk.end_seconds,
+        }
+
+
+def write_transcript_chunks(
+    video_name: str,
+    fragments: Iterable[dict],
+    buffer: BinaryIO,
+    video_id: Optional[str] = None,
+    **chunk_options,
+) -> str:
+    """
+    Streams the transcript into a binary buffer as JSON Lines of pre-chunked index documents,
+    see `chunk_documents`.
+
+    :param video_name: The name of the video
+    :param fragments: Transcript fragments, as found under `videos[].insights.transcript`
+    :param buffer: Writable binary buffer, e.g. `io.BytesIO`, to upload from
+    :param video_id: The video ID, used as the parent ID and in the chunk IDs
+    :param chunk_options: Options of `chunking.chunk_fragments`, e.g. `max_tokens`
+    :return: Hex SHA-256 digest of the written transcript
+    """
+    write, digest = _hashing_writer(buffer)
+    for document in chunk_documents(video_name, fragments, video_id, **chunk_options):
+        write(json.dumps(document, ensure_ascii=False) + "\n")
+
+    return digest.hexdigest()
+
+
+def prompt_content_sections(prompt_content) -> Iterator[dict]:
+    """
+    :param prompt_content: Prompt content of a video, as returned by `get_prompt_content`: one
+        partition, or a list of partitions for long videos
+    :return: Iterator over the sections of all partitions, in order
+    """
+    partitions = prompt_content if isinstance(prompt_content, list) else [prompt_content]
+    for partition in partitions:
+        yield from partition.get("sections", [])
+
+
+def section_documents(
+    video_name: str,
+    sections: Iterable[dict],
+    video_id: Optional[str] = None,
+) -> Iterator[dict]:
+    """
+    Converts prompt content sections into index documents, with the same fields as `chunk_documents`.
+    Each section's content already combines the transcript with the visual and audio insights of
+    its time range (e.g. `[Transcript]`, `[OCR]`, `[Labels]`), so it is indexed as one chunk.
+
+    :param video_name: The name of the video
+    :param sections: Prompt content sections, see `prompt_content_sections`
+    :param video_id: The video ID, used as the parent ID and in the chunk IDs
+    :return: Iterator over the documents, in section order
+    """
+    for i, section in enumerate(sections):
+        yield {
+            "chunk_id": f"{video_id}_{i:05d}",
+            "parent_id": video_id,
+            "title": video_name,
+            "chunk": section["content"],
+            "start": section["start"],
+            "end": section["end"],
+            "start_seconds": parse_timestamp(section["start"]),
+            "end_seconds": parse_timestamp(section["end"]),
+        }
+
+
+def write_transcript_sections(
+    video_name: str,
+    sections: Iterable[dict],
+    buffer: BinaryIO,
+    video_id: Optional[str] = None,
+) -> str:
+    """
+    Streams prompt content sections into a binary buffer as JSON Lines of index documents,
+    see `section_documents`.
+
+    :param video_name: The name of the video
+    :param sections: Prompt content sections, see `prompt_content_sections`
+    :param buffer: Writable binary buffer, e.g. `io.BytesIO`, to upload from
+    :param video_id: The video ID, used as the parent ID and in the chunk IDs
+    :return: Hex SHA-256 digest of the written documents
+    """
+    write, digest = _hashing_writer(buffer)
+    for document in section_documents(video_name, sections, video_id):
+        write(json.dumps(document, ensure_ascii=False) + "\n")
+
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class TranscriptFormat:
+    extension: str
+    content_type: str
+    write: Callable[..., str]
+
+
+TRANSCRIPT_FORMATS = {
+    "text": TranscriptFormat(".txt", "text/plain; charset=utf-8", write_transcript),
+    "jsonl": TranscriptFormat(".jsonl", "application/x-ndjson", write_transcript_jsonl),
+    "chunks": TranscriptFormat(
+        ".chunks.jsonl", "application/x-ndjson", write_transcript_chunks
+    ),
+    # Written from prompt content sections rather than transcript fragments (ETLSourceMode)
+    "sections": TranscriptFormat(
+        ".sections.jsonl", "application/x-ndjson", write_transcript_sections
+    ),
+}
+
+
+def transcript_blob_name(video_name: str, transcript_format: str = "text") -> str:
+    """
+    :param video_name: The name of the video
+    :param transcript_format: One of `TRANSCRIPT_FORMATS`
+    :return: Name of the video's transcript blob
+    """
+    return f"{video_name}{TRANSCRIPT_FORMATS[transcript_format].extension}"
+
+
+def write_transcript_blob(
+    video_name: str,
+    fragments: Iterable[dict],
+    buffer: BinaryIO,
+    video_id: Optional[str] = None,
+    transcript_format: str = "text",
+    compress: bool = False,
+    **format_options,
+) -> str:
+    """
+    Streams the transcript into a binary buffer in the given format, optionally gzip-compressed.
+    The blob should then be uploaded with `Content-Encoding: gzip`, which clients (including the
+    storage SDK's `download_blob`) decompress transparently.
+
+    :param video_name: The name of the video
+    :param fragments: Transcript fragments, as found under `videos[].insights.transcript`
+    :param buffer: Writable binary buffer, e.g. `io.BytesIO`, to upload from
+    :param video_id: The video ID
+    :param transcript_format: One of `TRANSCRIPT_FORMATS`
+    :param compress: Whether to gzip-compress the output
+    :param format_options: Options of the format's writer, e.g. the chunking options of "chunks"
+    :return: Hex SHA-256 digest of the uncompressed transcript
+    """
+    write = TRANSCRIPT_FORMATS[transcript_format].write
+    if not compress:
+        return write(video_name, fragments, buffer, video_id=video_id, **format_options)
+
+    # mtime=0 keeps the compressed output deterministic for identical transcripts
+    with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) as compressed:
+        return write(
+            video_name, fragments, compressed, video_id=video_id, **format_options
+        )
@@ -1,5 +1,6 @@
 # Credit to https://github.com/Azure-Samples/azure-search-python-samples/blob/main/Tutorial-RAG/Tutorial-rag.ipynb
 import argparse
+import sys
 
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents.indexes import SearchIndexClient, SearchIndexerClient
@@ -7,11 +8,20 @@ from azure.search.documents.indexes.models import (
     AzureOpenAIEmbeddingSkill,
     AzureOpenAIVectorizer,
     AzureOpenAIVectorizerParameters,
+    BinaryQuantizationCompression,
+    BlobIndexerParsingMode,
     CognitiveServicesAccountKey,
+    FieldMapping,
+    FieldMappingFunction,
     HnswAlgorithmConfiguration,
+    HnswParameters,
+    IndexingParameters,
+    IndexingParametersConfiguration,
     IndexProjectionMode,
     InputFieldMappingEntry,
     OutputFieldMappingEntry,
+    ScalarQuantizationCompression,
+    ScalarQuantizationParameters,
     SearchField,
     SearchFieldDataType,
     SearchIndex,
@@ -22,8 +32,13 @@ from azure.search.documents.indexes.models import (
     SearchIndexerIndexProjectionSelector,
     SearchIndexerIndexProjectionsParameters,
     SearchIndexerSkillset,
+    SemanticConfiguration,
+    SemanticField,
+    SemanticPrioritizedFields,
+    SemanticSearch,
     SplitSkill,
     VectorSearch,
+    VectorSearchCompressionTarget,
     VectorSearchProfile,
 )
 
@@ -33,10 +48,82 @@ DATA_SOURCE_NAME = "rag-transcript-ds"
 SKILLSET_NAME = "rag-transcript-ss"
 INDEXER_NAME = "rag-transcript-idxr"
 
+# Transcript blob formats written by the ETL (`TranscriptFormat` setting):
+# - "text": one plain-text blob per video, split into chunks by the skillset
+# - "jsonl": JSON Lines, one document per transcript fragment with its timestamps
+# - "chunks": JSON Lines of documents pre-chunked by the ETL along token budget, pause and speaker
+#   boundaries, with their time ranges; replaces the fixed-size SplitSkill with overlap
+# - "sections": JSON Lines of Video Indexer prompt content sections (`ETLSourceMode` set to
+#   "prompt_content"), with their time ranges and insights; indexed like "chunks"
+TRANSCRIPT_FORMATS = ["text", "jsonl", "chunks", "sections"]
+
+# Element types of the vector field: "single" (float32) or "half" (float16, half the storage)
+VECTOR_TYPES = {
+    "single": SearchFieldDataType.Single,
+    "half": "Edm.Half",
+}
+
+# Vector compression of the HNSW graph:
+# - "none": full-precision vectors
+# - "scalar": int8 quantization, 4x smaller than float32
+# - "binary": 1 bit per dimension, 32x smaller than float32
+# Compressed searches oversample candidates and rescore them with the full-precision vectors
+VECTOR_COMPRESSIONS = ["none", "scalar", "binary"]
+
+# Service defaults for HNSW; a larger m/ef_construction builds a denser graph (better recall,
+# larger index, slower indexing) and a larger ef_search trades query latency for recall
+DEFAULT_HNSW_M = 4
+DEFAULT_HNSW_EF_CONSTRUCTION = 400
+DEFAULT_HNSW_EF_SEARCH = 500
+DEFAULT_OVERSAMPLING = 4.0
+
+# Full-text (BM25) analysis of chunks, for hybrid queries; the English Lucene analyzer stems words
+DEFAULT_ANALYZER = "en.lucene"
+SEMANTIC_CONFIGURATION_NAME = "mySemanticConfig"
+
+
+def create_compression(compression: str, oversampling: float = DEFAULT_OVERSAMPLING):
+    """
+    Creates the vector compression configuration of the index.
+
+    Args:
+        compression (str): Vector compression, one of VECTOR_COMPRESSIONS.
+        oversampling (float): Candidates retrieved per requested neighbor, rescored with the full-precision vectors.
+    Returns:
+        The compression configuration, or None for "none".
+    """
+    if compression == "scalar":
+        return ScalarQuantizationCompression(
+            compression_name="myScalarQuantization",
+            rerank_with_original_vectors=True,
+            default_oversampling=oversampling,
+            parameters=ScalarQuantizationParameters(
+                quantized_data_type=VectorSearchCompressionTarget.INT8
+            ),
+        )
+    if compression == "binary":
+        return BinaryQuantizationCompression(
+            compression_name="myBinaryQuantization",
+            rerank_with_original_vectors=True,
+            default_oversampling=oversampling,
+        )
+    return None
+
 
 def create_index(
     index_client: SearchIndexClient,
     openai_url: str,
+    transcript_format: str = "text",
+    vector_type: str = "single",
+    compression: str = "none",
+    oversampling: float = DEFAULT_OVERSAMPLING,
+    store_vectors: bool = True,
+    hnsw_m: int = DEFAULT_HNSW_M,
+    hnsw_ef_construction: int = DEFAULT_HNSW_EF_CONSTRUCTION,
+    hnsw_ef_search: int = DEFAULT_HNSW_EF_SEARCH,
+    analyzer: str = DEFAULT_ANALYZER,
+    semantic: bool = False,
+    index_name: str = INDEX_NAME,
 ) -> None:
     """
     Creates an Azure Search index for RAG.
@@ -44,6 +131,17 @@ def create_index(
     Args:
         index_client (SearchIndexClient): Azure Search index client.
         openai_url (str): Azure OpenAI resource URL.
+        transcript_format (str): Transcript blob format, one of TRANSCRIPT_FORMATS.
+        vector_type (str): Element type of the vector field, one of VECTOR_TYPES.
+        compression (str): Vector compression, one of VECTOR_COMPRESSIONS.
+        oversampling (float): Default oversampling of compressed vector queries.
+        store_vectors (bool): Keep a retrievable copy of the vectors; not needed for search.
+        hnsw_m (int): Bi-directional links per node of the HNSW graph.
+        hnsw_ef_construction (int): Candidate list size while building the HNSW graph.
+        hnsw_ef_search (int): Candidate list size while querying the HNSW graph.
+        analyzer (str): Analyzer of the chunk text for full-text search.
+        semantic (bool): Create a semantic configuration, to rerank results with the semantic ranker.
+        index_name (str): Azure Search index name.
     Returns:
         None
     """
@@ -64,30 +162,72 @@ def create_index(
         SearchField(
             name="chunk",
             type=SearchFieldDataType.String,
+            searchable=True,
+            analyzer_name=analyzer,
             sortable=False,
             filterable=False,
             facetable=False,
         ),
         SearchField(
             name="text_vector",
-            type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
+            type=SearchFieldDataType.Collection(VECTOR_TYPES[vector_type]),
+            # Vectors that are not stored cannot be retrieved, only searched
+            hidden=not store_vectors,
+            stored=store_vectors,
             vector_search_dimensions=1024,
             vector_search_profile_name="myHnswProfile",
         ),
     ]
 
+    # Structured transcripts carry the time range of each document
+    if transcript_format != "text":
+        fields += [
+            SearchField(name="start", type=SearchFieldDataType.String),
+            SearchField(name="end", type=SearchFieldDataType.String),
+            SearchField(
+                name="start_seconds",
+                type=SearchFieldDataType.Double,
+                filterable=True,
+                sortable=True,
+            ),
+            SearchField(
+                name="end_seconds",
+                type=SearchFieldDataType.Double,
+                filterable=True,
+                sortable=True,
+            ),
+            SearchField(
+                name="speaker_id", type=SearchFieldDataType.Int32, filterable=True
+            ),
+        ]
+
     # Configure the vector search configuration
+    compression_configuration = create_compression(compression, oversampling)
     vector_search = VectorSearch(
         algorithms=[
-            HnswAlgorithmConfiguration(name="myHnsw"),
+            HnswAlgorithmConfiguration(
+                name="myHnsw",
+                parameters=HnswParameters(
+                    m=hnsw_m,
+                    ef_construction=hnsw_ef_construction,
+                    ef_search=hnsw_ef_search,
+                    metric="cosine",
+                ),
+            ),
         ],
         profiles=[
             VectorSearchProfile(
                 name="myHnswProfile",
                 algorithm_configuration_name="myHnsw",
                 vectorizer_name="myOpenAI",
+                compression_name=(
+                    compression_configuration.compression_name
+                    if compression_configuration
+                    else None
+                ),
             )
         ],
+        compressions=[compression_configuration] if compression_configuration else None,
         vectorizers=[
             AzureOpenAIVectorizer(
                 vectorizer_name="myOpenAI",
@@ -101,8 +241,29 @@ def create_index(
         ],
     )
 
+    # Configure the semantic ranker, which reranks the top results of a query by meaning
+    semantic_search = None
+    if semantic:
+        semantic_search = SemanticSearch(
+            default_configuration_name=SEMANTIC_CONFIGURATION_NAME,
+            configurations=[
+                SemanticConfiguration(
+                    name=SEMANTIC_CONFIGURATION_NAME,
+                    prioritized_fields=SemanticPrioritizedFields(
+                        title_field=SemanticField(field_name="title"),
+                        content_fields=[SemanticField(field_name="chunk")],
+                    ),
+                )
+            ],
+        )
+
     # Create the search index
-    index = SearchIndex(name=INDEX_NAME, fields=fields, vector_search=vector_search)
+    index = SearchIndex(
+        name=index_name,
+        fields=fields,
+        vector_search=vector_search,
+        semantic_search=semantic_search,
+    )
     index_client.create_or_update_index(index)
 
 
@@ -132,6 +293,7 @@ def create_skillset(
     indexer_client: SearchIndexerClient,
     openai_url: str,
     cognitive_services_account: CognitiveServicesAccountKey,
+    transcript_format: str = "text",
 ) -> None:
     """
     Creates an Azure Search skillset for RAG.
@@ -140,10 +302,38 @@ def create_skillset(
         indexer_client (SearchIndexerClient): Azure Search indexer client.
         openai_url (str): Azure OpenAI resource URL.
         cognitive_services_account (CognitiveServicesAccountKey): Cognitive services account key.
+        transcript_format (str): Transcript blob format, one of TRANSCRIPT_FORMATS.
     Returns:
         None
     """
 
+    # JSON Lines fragments and pre-chunked documents are already small, timestamped documents:
+    # embed them as they are
+    if transcript_format != "text":
+        text_source = "/document/text" if transcript_format == "jsonl" else "/document/chunk"
+        embedding_skill = AzureOpenAIEmbeddingSkill(
+            description="Skill to generate embeddings via Azure OpenAI",
+            context="/document",
+            resource_url=openai_url,
+            deployment_name="text-embedding-3-large",
+            model_name="text-embedding-3-large",
+            dimensions=1024,
+            inputs=[
+                InputFieldMappingEntry(name="text", source=text_source),
+            ],
+            outputs=[
+                OutputFieldMappingEntry(name="embedding", target_name="text_vector")
+            ],
+        )
+        skillset = SearchIndexerSkillset(
+            name=SKILLSET_NAME,
+            description="Skillset to generate embeddings of transcript fragments or chunks",
+            skills=[embedding_skill],
+            cognitive_services_account=cognitive_services_account,
+        )
+        indexer_client.create_or_update_skillset(skillset)
+        return
+
     split_skill = SplitSkill(
         description="Split skill to chunk documents",
         text_split_mode="pages",
@@ -208,6 +398,7 @@ def create_indexer(
     index_name: str,
     data_source_name: str,
     skillset_name: str,
+    transcript_format: str = "text",
 ) -> None:
     """
     Creates an Azure Search indexer for RAG.
@@ -217,11 +408,43 @@ def create_indexer(
         index_name (str): Azure Search index name.
         data_source_name (str): Azure Search data source name.
         skillset_name (str): Azure Search skillset name.
+        transcript_format (str): Transcript blob format, one of TRANSCRIPT_FORMATS.
     Returns:
         None
     """
 
     indexer_parameters = None
+    field_mappings = None
+    output_field_mappings = None
+    if transcript_format != "text":
+        # Each line is a document; fields with matching names (start, end, ...) map implicitly
+        indexer_parameters = IndexingParameters(
+            configuration=IndexingParametersConfiguration(
+                parsing_mode=BlobIndexerParsingMode.JSON_LINES,
+                indexed_file_name_extensions=".jsonl",
+                query_timeout=None,
+            )
+        )
+        output_field_mappings = [
+            FieldMapping(
+                source_field_name="/document/text_vector",
+                target_field_name="text_vector",
+            )
+        ]
+
+    # Pre-chunked documents already carry the index fields; fragments need their key and names mapped
+    if transcript_format == "jsonl":
+        field_mappings = [
+            FieldMapping(
+                source_field_name="AzureSearch_DocumentKey",
+                target_field_name="chunk_id",
+                mapping_function=FieldMappingFunction(name="base64Encode"),
+            ),
+            FieldMapping(source_field_name="text", target_field_name="chunk"),
+            FieldMapping(source_field_name="video_name", target_field_name="title"),
+            FieldMapping(source_field_name="video_id", target_field_name="parent_id"),
+        ]
+
     indexer = SearchIndexer(
         name=INDEXER_NAME,
         description="Indexer to index documents and generate embeddings",
@@ -229,6 +452,8 @@ def create_indexer(
         target_index_name=index_name,
         data_source_name=data_source_name,
         parameters=indexer_parameters,
+        field_mappings=field_mappings,
+        output_field_mappings=output_field_mappings,
     )
 
     indexer_client.create_or_update_indexer(indexer)
@@ -240,17 +465,71 @@ if __name__ == "__main__":
     parser.add_argument("--srch-url", type=str, required=True)
     parser.add_argument("--srch-api-key", type=str, required=True)
     parser.add_argument("--openai-url", type=str, required=True)
-    parser.add_argument("--st-connection-string", type=str, required=True)
-    parser.add_argument("--ai-multiservice-account-key", type=str, required=True)
+    parser.add_argument("--st-connection-string", type=str)
+    parser.add_argument("--ai-multiservice-account-key", type=str)
+    parser.add_argument(
+        "--transcript-format", type=str, choices=TRANSCRIPT_FORMATS, default="text"
+    )
+    parser.add_argument(
+        "--push-mode",
+        action="store_true",
+        help="Only create the index, for the ETL to push embedded chunks to (SearchPushMode)",
+    )
+    # Vector storage and HNSW tuning; compare configurations with bench/vector_search.py
+    parser.add_argument(
+        "--vector-type", type=str, choices=list(VECTOR_TYPES), default="single"
+    )
+    parser.add_argument(
+        "--vector-compression", type=str, choices=VECTOR_COMPRESSIONS, default="none"
+    )
+    parser.add_argument("--oversampling", type=float, default=DEFAULT_OVERSAMPLING)
+    parser.add_argument(
+        "--no-store-vectors",
+        action="store_true",
+        help="Do not keep a retrievable copy of the vectors, which are then only searchable",
+    )
+    parser.add_argument("--hnsw-m", type=int, default=DEFAULT_HNSW_M)
+    parser.add_argument(
+        "--hnsw-ef-construction", type=int, default=DEFAULT_HNSW_EF_CONSTRUCTION
+    )
+    parser.add_argument("--hnsw-ef-search", type=int, default=DEFAULT_HNSW_EF_SEARCH)
+    # Hybrid search
+    parser.add_argument("--analyzer", type=str, default=DEFAULT_ANALYZER)
+    parser.add_argument(
+        "--semantic",
+        action="store_true",
+        help="Create a semantic configuration; requires the semantic ranker on the search service",
+    )
 
     args = parser.parse_args()
+    if not args.push_mode and (
+        args.st_connection_string is None or args.ai_multiservice_account_key is None
+    ):
+        parser.error(
+            "--st-connection-string and --ai-multiservice-account-key are required without --push-mode"
+        )
 
     # Execute setup
-    # - Create index
+    # - Create index; pushed documents are pre-chunked, with their time ranges
     index_client = SearchIndexClient(
         args.srch_url, AzureKeyCredential(args.srch_api_key)
     )
-    create_index(index_client, args.openai_url)
+    create_index(
+        index_client,
+        args.openai_url,
+        "chunks" if args.push_mode else args.transcript_format,
+        vector_type=args.vector_type,
+        compression=args.vector_compression,
+        oversampling=args.oversampling,
+        store_vectors=not args.no_store_vectors,
+        hnsw_m=args.hnsw_m,
+        hnsw_ef_construction=args.hnsw_ef_construction,
+        hnsw_ef_search=args.hnsw_ef_search,
+        analyzer=args.analyzer,
+        semantic=args.semantic,
+    )
+    if args.push_mode:
+        sys.exit(0)
 
     # - Create data source
     indexer_client = SearchIndexerClient(
@@ -262,7 +541,18 @@ if __name__ == "__main__":
     cognitive_services_account = CognitiveServicesAccountKey(
         key=args.ai_multiservice_account_key
     )
-    create_skillset(indexer_client, args.openai_url, cognitive_services_account)
+    create_skillset(
+        indexer_client,
+        args.openai_url,
+        cognitive_services_account,
+        args.transcript_format,
+    )
 
     # - Create indexer
-    create_indexer(indexer_client, INDEX_NAME, DATA_SOURCE_NAME, SKILLSET_NAME)
+    create_indexer(
+        indexer_client,
+        INDEX_NAME,
+        DATA_SOURCE_NAME,
+        SKILLSET_NAME,
+        args.transcript_format,
+    )